@@ -34,6 +34,7 @@ from .utils import (
     RetryHandler,
     setup_logger,
     create_session,
+    mount_connection_pool,
     extract_filename_from_url,
     format_progress
 )
@@ -84,6 +85,7 @@ __all__ = [
     "RetryHandler",
     "setup_logger",
     "create_session",
+    "mount_connection_pool",
     "extract_filename_from_url",
     "format_progress"
 ]
@@ -6,7 +6,25 @@
 import os
 import multiprocessing
 from dataclasses import dataclass, field
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple, Set
+
+
+# 本进程中已确认存在的目录（绝对路径），重复创建配置时不再调用 makedirs
+_ensured_dirs: Set[str] = set()
+
+
+def ensure_dir(path: str):
+    """确保目录存在；同一目录只在第一次调用时访问文件系统"""
+    path = os.path.abspath(path)
+    if path in _ensured_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    _ensured_dirs.add(path)
+
+
+def forget_dir(path: str):
+    """目录被删除后调用，下次 ensure_dir 时重新创建"""
+    _ensured_dirs.discard(os.path.abspath(path))
 
 
 @dataclass
@@ -25,8 +43,10 @@ class DownloadConfig:
     retry_delay: float = 1.0  # 秒
 
     # 下载配置
-    chunk_size: int = 8192  # 下载块大小
+    chunk_size: int = 64 * 1024  # 下载块大小
     buffer_size: int = 1024 * 1024  # 文件写入缓冲区大小
+    pool_maxsize: Optional[int] = None  # 单个任务每个主机的 HTTP 连接池大小（默认为线程数，批量下载时乘以并发任务数）
+    fsync_segments: bool = False  # 是否每个片段写入后都 fsync（默认只在合并输出后 fsync 一次）
 
     # 路径配置
     temp_dir: str = "temp"
@@ -59,6 +79,9 @@ class DownloadConfig:
     # 密钥缓存有效期（秒）
     key_cache_ttl: int = 3600
 
+    # 内存中最多保留的密钥数（按最近使用淘汰，过期时间同 key_cache_ttl）
+    key_memory_cache_size: int = 512
+
     # 下载完成后是否清理密钥缓存
     clean_key_cache: bool = False
 
@@ -68,46 +91,69 @@ class DownloadConfig:
     # 自定义 IV（十六进制字符串，如 "0x12345678..."）
     custom_iv: Optional[str] = None
 
+    # 自定义密钥 / IV 解析结果缓存：(原始配置值, 解析结果)，配置值改变后重新解析
+    _custom_key_cache: Optional[Tuple[str, bytes]] = field(
+        default=None, init=False, repr=False, compare=False)
+    _custom_iv_cache: Optional[Tuple[str, Optional[bytes]]] = field(
+        default=None, init=False, repr=False, compare=False)
+
+    # 解密进程数（0 表示在下载线程内直接解密；大于 0 时使用进程池绕过 GIL；小于 0 时按 CPU 核心数）
+    decrypt_processes: int = 0
+
     def __post_init__(self):
         """初始化后处理"""
         if self.num_threads is None:
             self.num_threads = multiprocessing.cpu_count() * 2
+        if self.pool_maxsize is None:
+            self.pool_maxsize = self.num_threads
 
         # 确保临时目录和输出目录存在
-        os.makedirs(self.temp_dir, exist_ok=True)
-        os.makedirs(self.output_dir, exist_ok=True)
+        ensure_dir(self.temp_dir)
+        ensure_dir(self.output_dir)
 
         # 确保密钥缓存目录存在
         if self.auto_decrypt:
-            os.makedirs(self.key_cache_dir, exist_ok=True)
+            ensure_dir(self.key_cache_dir)
 
     def update_headers(self, extra_headers: Dict[str, str]):
         """更新请求头"""
         self.headers.update(extra_headers)
 
     def get_custom_key(self) -> Optional[bytes]:
-        """获取自定义密钥"""
+        """获取自定义密钥（读取成功后缓存，不再重复读取文件）"""
         if not self.custom_key_path:
             return None
 
+        cached = self._custom_key_cache
+        if cached is not None and cached[0] == self.custom_key_path:
+            return cached[1]
+
         try:
             with open(self.custom_key_path, 'rb') as f:
-                return f.read()
+                key = f.read()
         except Exception:
             return None
+        self._custom_key_cache = (self.custom_key_path, key)
+        return key
 
     def get_custom_iv(self) -> Optional[bytes]:
-        """获取自定义 IV"""
+        """获取自定义 IV（解析结果按配置值缓存）"""
         if not self.custom_iv:
             return None
 
+        cached = self._custom_iv_cache
+        if cached is not None and cached[0] == self.custom_iv:
+            return cached[1]
+
         try:
             iv_string = self.custom_iv
             if iv_string.startswith('0x') or iv_string.startswith('0X'):
                 iv_string = iv_string[2:]
-            return bytes.fromhex(iv_string.zfill(32))
+            iv = bytes.fromhex(iv_string.zfill(32))
         except Exception:
-            return None
+            iv = None
+        self._custom_iv_cache = (self.custom_iv, iv)
+        return iv
 
     def to_dict(self):
         """转换为字典"""
@@ -119,6 +165,8 @@ class DownloadConfig:
             'retry_delay': self.retry_delay,
             'chunk_size': self.chunk_size,
             'buffer_size': self.buffer_size,
+            'pool_maxsize': self.pool_maxsize,
+            'fsync_segments': self.fsync_segments,
             'temp_dir': self.temp_dir,
             'output_dir': self.output_dir,
             'headers': self.headers,
@@ -128,9 +176,11 @@ class DownloadConfig:
             'auto_decrypt': self.auto_decrypt,
             'key_cache_dir': self.key_cache_dir,
             'key_cache_ttl': self.key_cache_ttl,
+            'key_memory_cache_size': self.key_memory_cache_size,
             'clean_key_cache': self.clean_key_cache,
             'custom_key_path': self.custom_key_path,
             'custom_iv': self.custom_iv,
+            'decrypt_processes': self.decrypt_processes,
         }
 
 
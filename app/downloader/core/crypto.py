@@ -5,23 +5,88 @@
 
 import os
 import time
-import hashlib
 import logging
-from typing import Optional, Dict, Tuple
+import warnings
+import struct
+import functools
+import importlib.util
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Tuple, Any, Iterable, List, Union
 from dataclasses import dataclass
 
+import requests
 from urllib3.exceptions import InsecureRequestWarning
 
+# 解密库只检查是否已安装，真正的导入推迟到第一次解密时（见 _import_crypto），
+# 只下载未加密流时不承担 pycryptodome / cryptography 的导入开销
+CRYPTO_AVAILABLE = importlib.util.find_spec("Crypto") is not None
+
+# 可选：cryptography 基于 OpenSSL EVP，自动使用 AES-NI / ARMv8 CE 硬件指令
+EVP_AVAILABLE = importlib.util.find_spec("cryptography") is not None
+
+AES = None
+Cipher = algorithms = modes = None
+_crypto_loaded = False
+
 try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# PKCS7 填充长度 -> 对应的填充字节串，校验填充时直接比较，不再逐次构造
+_PKCS7_PADDINGS = tuple(bytes((n,)) * n for n in range(17))
+
+# 序列号 IV：高 8 字节为 0，低 8 字节为大端序列号（序列号小于 2**64 时使用）
+_SEQUENCE_IV = struct.Struct('>8xQ')
+
+# AES 分组大小（字节）
+_AES_BLOCK_SIZE = 16
+
+# 超过该大小的片段通过共享内存传给解密进程，较小的片段直接 pickle 传递
+SHARED_MEMORY_THRESHOLD = 256 * 1024
+
+
+def _import_crypto():
+    """
+    导入解密库（只在第一次需要解密时执行）
+
+    Raises:
+        ImportError: pycryptodome 无法导入
+    """
+    global AES, Cipher, algorithms, modes, EVP_AVAILABLE, _crypto_loaded
+    if _crypto_loaded:
+        return
     from Crypto.Cipher import AES
-    from Crypto.Util.Padding import unpad
+    if EVP_AVAILABLE:
+        try:
+            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        except ImportError:
+            EVP_AVAILABLE = False
+    _crypto_loaded = True
 
-    CRYPTO_AVAILABLE = True
-except ImportError:
-    CRYPTO_AVAILABLE = False
 
-import requests
-import warnings
+def _write_file_atomic(path: str, data: bytes):
+    """
+    原子写入小文件：先写入同目录下的临时文件，再用 os.replace 替换目标文件，
+    中途崩溃或并发读取时不会出现只写了一半的文件
+
+    Args:
+        path: 目标文件路径
+        data: 文件内容
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 @dataclass
@@ -55,33 +120,52 @@ class KeyManager:
     负责下载、缓存和管理 M3U8 加密密钥
     """
 
-    def __init__(self, cache_dir: str = ".key_cache", cache_ttl: int = 3600):
+    def __init__(self, cache_dir: str = ".key_cache", cache_ttl: int = 3600,
+                 session: Optional[requests.Session] = None,
+                 memory_cache_size: int = 512):
         """
         初始化密钥管理器
 
         Args:
             cache_dir: 密钥缓存目录
             cache_ttl: 缓存有效期（秒），默认 1 小时
+            session: 共用的 HTTP 会话（如下载片段用的会话），密钥与片段通常来自
+                同一源站，共用连接池可复用已建立的长连接；不提供时按需创建
+            memory_cache_size: 内存中最多保留的已下载密钥数
         """
         self.cache_dir = cache_dir
         self.cache_ttl = cache_ttl
-        self._session: Optional[requests.Session] = None
+        self.memory_cache_size = memory_cache_size
+        # (URI, verify_ssl, 请求头) -> (密钥, 过期时间)，多个任务共用同一个密钥 URI 时只下载一次
+        self._memory_cache: "OrderedDict[Tuple, Tuple[bytes, float]]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        # 缓存名 -> 已写入该缓存文件的密钥，内存命中时据此跳过重复写文件
+        self._saved_keys: Dict[str, bytes] = {}
+        self._session: Optional[requests.Session] = session
         self.logger = logging.getLogger(__name__)
+        # 后台预取密钥：缓存名 -> Future，片段解密前才等待结果
+        self._pending_keys: Dict[str, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._prefetch_pool: Optional[ThreadPoolExecutor] = None
 
         # 确保缓存目录存在
         os.makedirs(cache_dir, exist_ok=True)
 
-    def _get_session(self, verify_ssl: bool = False, headers: Optional[Dict] = None) -> requests.Session:
-        """获取或创建 HTTP 会话"""
-        if self._session is None:
-            self._session = requests.Session()
-            self._session.verify = verify_ssl
-            if not verify_ssl:
-                warnings.filterwarnings(
-                    'ignore', category=InsecureRequestWarning)
+    def _get_session(self, verify_ssl: bool = False) -> requests.Session:
+        """
+        获取或创建 HTTP 会话
 
-        if headers:
-            self._session.headers.update(headers)
+        会话创建后不再修改，请求头在每次请求时传入，多个线程可以安全共用
+        """
+        if self._session is None:
+            with self._pending_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.verify = verify_ssl
+                    if not verify_ssl:
+                        warnings.filterwarnings(
+                            'ignore', category=InsecureRequestWarning)
+                    self._session = session
 
         return self._session
 
@@ -91,11 +175,12 @@ class KeyManager:
 
     def _is_cache_valid(self, cache_path: str) -> bool:
         """检查缓存是否有效"""
-        if not os.path.exists(cache_path):
+        # 一次 stat 同时判断文件是否存在并取得修改时间
+        try:
+            mtime = os.stat(cache_path).st_mtime
+        except OSError:
             return False
 
-        # 检查文件修改时间
-        mtime = os.path.getmtime(cache_path)
         return (time.time() - mtime) < self.cache_ttl
 
     # 重写下载密码以及保存到本地
@@ -104,10 +189,23 @@ class KeyManager:
                 verify_ssl: bool = False,
                 headers: Optional[Dict] = None,
                 force_refresh: bool = False) -> Optional[bytes]:
+        memory_key = (uri, verify_ssl, tuple(sorted(headers.items())) if headers else ())
+
+        # 1. 内存缓存（最近使用的密钥，未过期时直接返回）
+        if not force_refresh:
+            key_data = self._get_from_memory(memory_key)
+            if key_data is not None:
+                # 按任务名读取密钥时需要缓存文件，只在该文件还没有写入这个密钥
+                # （或已被清理）时写入，命中内存缓存时不再每次都重写
+                if (self._saved_keys.get(name) != key_data
+                        or not os.path.exists(self.get_cache_path(name))):
+                    self._save_to_cache(name, key_data)
+                return key_data
+
         # 3. 从网络下载
         try:
-            session = self._get_session(verify_ssl, headers)
-            response = session.get(uri, timeout=30)
+            session = self._get_session(verify_ssl)
+            response = session.get(uri, timeout=30, headers=headers)
             response.raise_for_status()
 
             key_data = response.content
@@ -124,6 +222,7 @@ class KeyManager:
             self.logger.info(f"密钥:{key_data} 保存到:{uri}")
             # 保存到缓存
             self._save_to_cache(name, key_data)
+            self._put_to_memory(memory_key, key_data)
 
             self.logger.info(f"成功下载密钥: {uri[:50]}...")
             return key_data
@@ -132,24 +231,91 @@ class KeyManager:
             self.logger.error(f"下载密钥失败: {uri} - {e}")
             return None
 
+    def _get_from_memory(self, memory_key: Tuple) -> Optional[bytes]:
+        """从内存缓存取出未过期的密钥，过期的条目直接删除"""
+        with self._memory_lock:
+            entry = self._memory_cache.get(memory_key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._memory_cache[memory_key]
+                return None
+            self._memory_cache.move_to_end(memory_key)
+            return entry[0]
+
+    def _put_to_memory(self, memory_key: Tuple, key_data: bytes):
+        """把密钥放入内存缓存，超过容量时淘汰最久未用的密钥"""
+        expires = time.monotonic() + self.cache_ttl
+        with self._memory_lock:
+            self._memory_cache[memory_key] = (key_data, expires)
+            self._memory_cache.move_to_end(memory_key)
+            while len(self._memory_cache) > self.memory_cache_size:
+                self._memory_cache.popitem(last=False)
+
     def _save_to_cache(self, uri: str, key_data: bytes):
         """保存密钥到缓存"""
         cache_path = self.get_cache_path(uri)
-        # 文件缓存
+        # 文件缓存（原子写入，读取方不会看到只写了一半的密钥文件）
         try:
-            with open(cache_path, 'wb') as f:
-                f.write(key_data)
+            _write_file_atomic(cache_path, key_data)
+            with self._memory_lock:
+                self._saved_keys[uri] = key_data
         except Exception as e:
             self.logger.warning(f"保存密钥缓存失败: {e}")
 
+    def preload_async(self, uri: str,
+                      name: str,
+                      verify_ssl: bool = False,
+                      headers: Optional[Dict] = None) -> Future:
+        """
+        在后台线程中下载密钥，与片段下载同时进行
+
+        同一缓存名重复调用时返回同一个 Future
+
+        Args:
+            uri: 密钥 URI
+            name: 缓存名（任务名）
+            verify_ssl: 是否验证 SSL
+            headers: 请求头
+
+        Returns:
+            Future: 结果为密钥内容，下载失败时为 None
+        """
+        with self._pending_lock:
+            future = self._pending_keys.get(name)
+            if future is None:
+                if self._prefetch_pool is None:
+                    self._prefetch_pool = ThreadPoolExecutor(
+                        max_workers=4, thread_name_prefix="key-prefetch")
+                future = self._prefetch_pool.submit(
+                    self.get_key, uri, name, verify_ssl, headers)
+                self._pending_keys[name] = future
+            return future
+
+    def get_pending(self, name: str) -> Optional[Future]:
+        """获取缓存名对应的预取 Future，没有预取时返回 None"""
+        return self._pending_keys.get(name)
+
+    def shutdown(self):
+        """等待预取完成并释放预取线程，清除预取记录"""
+        with self._pending_lock:
+            pool, self._prefetch_pool = self._prefetch_pool, None
+            self._pending_keys.clear()
+        if pool is not None:
+            pool.shutdown(wait=True)
+
     def clear_cache(self):
         """清除所有缓存"""
+        with self._memory_lock:
+            self._memory_cache.clear()
+            self._saved_keys.clear()
 
         # 清除文件缓存
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.key'):
-                    os.remove(os.path.join(self.cache_dir, filename))
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.key') and entry.is_file(follow_symlinks=False):
+                        os.remove(entry.path)
             self.logger.info("密钥缓存已清除")
         except Exception as e:
             self.logger.warning(f"清除密钥缓存失败: {e}")
@@ -176,6 +342,12 @@ class AESDecryptor:
 
         self.key_manager = key_manager or KeyManager()
         self.logger = logging.getLogger(__name__)
+        # 解密后端：安装了 cryptography 时使用 OpenSSL EVP，否则使用 pycryptodome
+        self.backend = "openssl" if EVP_AVAILABLE else "pycryptodome"
+        # 密钥 -> 预先准备好的解密上下文（同一任务的所有片段共用一个密钥）
+        self._schedules: Dict[bytes, Any] = {}
+        # 密钥预取回调与下载线程都可能准备解密上下文
+        self._schedules_lock = threading.Lock()
 
     def load_key_from_uri(
             self,
@@ -198,6 +370,10 @@ class AESDecryptor:
         # if uri == self._current_key_uri and self._current_key:
         #     return True  # 已加载相同密钥
 
+        # 已在后台预取时直接等待预取结果，不再重复下载
+        future = self.key_manager.get_pending(name)
+        if future is not None:
+            return future.result()
         return self.key_manager.get_key(uri, name, verify_ssl, headers)
         # if key:
         #     self._current_key = key
@@ -218,10 +394,13 @@ class AESDecryptor:
         Returns:
             bytes: 16 字节 IV
         """
-        # 序列号转为 16 字节大端整数
+        # 序列号转为 16 字节大端整数，常见的 64 位以内序列号直接用预编译的 struct 打包
+        if 0 <= sequence_number < 0x10000000000000000:
+            return _SEQUENCE_IV.pack(sequence_number)
         return sequence_number.to_bytes(16, byteorder='big')
 
     @staticmethod
+    @functools.lru_cache(maxsize=64)
     def parse_iv_string(iv_string: str) -> bytes:
         """
         解析 IV 字符串
@@ -237,7 +416,8 @@ class AESDecryptor:
             iv_string = iv_string[2:]
 
         # 确保是 32 个十六进制字符（16 字节）
-        iv_string = iv_string.zfill(32)
+        if len(iv_string) != 32:
+            iv_string = iv_string.zfill(32)
 
         return bytes.fromhex(iv_string)
 
@@ -246,8 +426,9 @@ class AESDecryptor:
             encrypted_data: bytes,
             key: bytes,  # --- 修改：强制要求传入 key ---
             iv: Optional[bytes] = None,
-            sequence_number: int = 0
-    ) -> bytes:
+            sequence_number: int = 0,
+            out: Optional[bytearray] = None
+    ) -> Union[bytes, memoryview]:
         """
         解密数据
 
@@ -255,13 +436,20 @@ class AESDecryptor:
             encrypted_data: 加密的数据
             iv: 初始向量，如果为 None 则根据序列号生成
             sequence_number: 片段序列号（当 IV 为 None 时使用）
+            out: 可选的输出缓冲区（长度不小于 encrypted_data），提供时明文直接
+                写入该缓冲区，可在多个片段之间复用；也可以就是 encrypted_data 本身
 
         Returns:
-            bytes: 解密后的数据
+            Union[bytes, memoryview]: 未提供 out 时返回解密后的 bytes；提供 out 时
+                返回指向 out 的 memoryview（已去除填充），不复制数据
 
         Raises:
             ValueError: 密钥未设置或解密失败
         """
+        if out is not None:
+            size = self.decrypt_into(encrypted_data, out, key, iv, sequence_number)
+            return memoryview(out)[:size]
+
         if not key:
             raise ValueError("解密密钥未设置")
 
@@ -270,23 +458,376 @@ class AESDecryptor:
             iv = self.generate_iv_from_sequence(sequence_number)
 
         try:
-            # 创建 AES-CBC 解密器
-            cipher = AES.new(key, AES.MODE_CBC, iv)
+            # 同一密钥的解密上下文只准备一次，每次只需传入新的 IV
+            schedule = self.prepare_schedule(key)
+            if self.backend == "openssl":
+                # OpenSSL EVP 解密（自动使用 AES-NI），填充由下面统一处理
+                decryptor = Cipher(schedule, modes.CBC(iv)).decryptor()
+                decrypted_data = decryptor.update(encrypted_data) + decryptor.finalize()
+            else:
+                # 创建 AES-CBC 解密器并解密
+                decrypted_data = schedule(iv=iv).decrypt(encrypted_data)
+
+            # 移除 PKCS7 填充（某些流可能没有标准填充，此时原样返回）
+            size = len(decrypted_data)
+            unpadded = self._unpadded_length(decrypted_data, size)
+            return decrypted_data[:unpadded] if unpadded != size else decrypted_data
+
+        except Exception as e:
+            self.logger.error(f"解密失败: {e}")
+            raise ValueError(f"解密失败: {e}")
+
+    def decrypt_into(
+            self,
+            src,
+            dst,
+            key: bytes,
+            iv: Optional[bytes] = None,
+            sequence_number: int = 0
+    ) -> int:
+        """
+        解密数据并写入调用方提供的缓冲区
+
+        dst 可以与 src 是同一个 bytearray（原地解密），避免为明文再分配一份内存
+
+        Args:
+            src: 加密的数据（bytes / bytearray / memoryview）
+            dst: 可写缓冲区（bytearray / memoryview），长度不小于 src
+            key: 解密密钥
+            iv: 初始向量，如果为 None 则根据序列号生成
+            sequence_number: 片段序列号（当 IV 为 None 时使用）
+
+        Returns:
+            int: 去除 PKCS7 填充后的明文长度
+
+        Raises:
+            ValueError: 密钥未设置或解密失败
+        """
+        if not key:
+            raise ValueError("解密密钥未设置")
+
+        if iv is None:
+            iv = self.generate_iv_from_sequence(sequence_number)
+
+        try:
+            return self.decrypt_with_schedule(
+                self.prepare_schedule(key), iv, src, dst)
 
-            # 解密
-            decrypted_data = cipher.decrypt(encrypted_data)
+        except Exception as e:
+            self.logger.error(f"解密失败: {e}")
+            raise ValueError(f"解密失败: {e}")
+
+    def prepare_schedule(self, key: bytes) -> Any:
+        """
+        为密钥准备解密上下文，同一密钥只准备一次
+
+        密钥在整个任务内不变，只有 IV 随片段变化。OpenSSL 后端缓存
+        algorithms.AES 对象；pycryptodome 不支持在已有的 CBC 对象上重置 IV，
+        因此缓存的是绑定了密钥的 CBC 构造器。每个片段只需传入 IV，密钥校验只做一次
+
+        Args:
+            key: 解密密钥
+
+        Returns:
+            Any: 解密上下文，传给 decrypt_with_schedule 使用
+
+        Raises:
+            ValueError: 密钥长度无效
+        """
+        schedule = self._schedules.get(key)
+        if schedule is None:
+            _import_crypto()
+            if self.backend == "openssl" and not EVP_AVAILABLE:
+                self.backend = "pycryptodome"
+            if len(key) not in AES.key_size:
+                raise ValueError(f"无效的密钥长度: {len(key)} bytes")
+            if self.backend == "openssl":
+                schedule = algorithms.AES(key)
+            else:
+                schedule = functools.partial(AES.new, key, AES.MODE_CBC)
+            with self._schedules_lock:
+                schedule = self._schedules.setdefault(key, schedule)
+        return schedule
+
+    def clear_schedules(self):
+        """释放所有已准备的解密上下文"""
+        with self._schedules_lock:
+            self._schedules.clear()
+
+    def decrypt_with_schedule(self, schedule: Any, iv: bytes, src, dst) -> int:
+        """
+        使用预先准备的解密上下文解密数据
 
-            # 移除 PKCS7 填充
+        Args:
+            schedule: prepare_schedule 返回的解密上下文
+            iv: 初始向量
+            src: 加密的数据
+            dst: 可写缓冲区，可以与 src 相同
+
+        Returns:
+            int: 去除 PKCS7 填充后的明文长度
+        """
+        size = len(src)
+        if self.backend == "openssl":
+            _evp_decrypt_into(schedule, iv, src, dst, size)
+        else:
+            # pycryptodome 要求输出长度与输入完全一致
+            if len(dst) != size:
+                with memoryview(dst) as view:
+                    schedule(iv=iv).decrypt(src, output=view[:size])
+            else:
+                schedule(iv=iv).decrypt(src, output=dst)
+        return self._unpadded_length(dst, size)
+
+    def stream_decryptor(self, key: bytes, iv: Optional[bytes] = None,
+                         sequence_number: int = 0) -> "CBCStreamDecryptor":
+        """
+        创建分块解密器，数据边下载边解密，不必等整个片段下载完
+
+        Args:
+            key: 解密密钥
+            iv: 初始向量，如果为 None 则根据序列号生成
+            sequence_number: 片段序列号（当 IV 为 None 时使用）
+
+        Returns:
+            CBCStreamDecryptor: 绑定了密钥和 IV 的分块解密器
+
+        Raises:
+            ValueError: 密钥未设置或长度无效
+        """
+        if not key:
+            raise ValueError("解密密钥未设置")
+
+        if iv is None:
+            iv = self.generate_iv_from_sequence(sequence_number)
+
+        schedule = self.prepare_schedule(key)
+        if self.backend == "openssl":
+            return CBCStreamDecryptor(Cipher(schedule, modes.CBC(iv)).decryptor())
+        return CBCStreamDecryptor(schedule(iv=iv))
+
+    def decrypt_many(self, key: bytes, pairs: Iterable[Tuple[bytes, Any]]) -> List[bytearray]:
+        """
+        批量解密使用同一密钥的多个片段
+
+        密钥只校验和准备一次，之后逐个片段只更换 IV，并在各自的缓冲区内原地解密
+
+        Args:
+            key: 解密密钥
+            pairs: (IV, 加密数据) 序列
+
+        Returns:
+            List[bytearray]: 与 pairs 顺序一致的明文（已去除填充）
+
+        Raises:
+            ValueError: 密钥未设置或解密失败
+        """
+        if not key:
+            raise ValueError("解密密钥未设置")
+
+        try:
+            schedule = self.prepare_schedule(key)
+            results = []
+            for iv, data in pairs:
+                buf = bytearray(data)
+                del buf[self.decrypt_with_schedule(schedule, iv, buf, buf):]
+                results.append(buf)
+            return results
+
+        except Exception as e:
+            self.logger.error(f"解密失败: {e}")
+            raise ValueError(f"解密失败: {e}")
+
+    def decrypt_in_pool(
+            self,
+            pool,
+            data: bytearray,
+            key: bytes,
+            iv: Optional[bytes] = None,
+            sequence_number: int = 0
+    ) -> int:
+        """
+        在进程池中原地解密数据
+
+        大片段通过共享内存传给子进程，避免 pickle 整个片段；小于
+        SHARED_MEMORY_THRESHOLD 的片段直接传递，省去创建共享内存的开销
+
+        Args:
+            pool: ProcessPoolExecutor
+            data: 加密的数据，解密结果写回该缓冲区
+            key: 解密密钥
+            iv: 初始向量，如果为 None 则根据序列号生成
+            sequence_number: 片段序列号（当 IV 为 None 时使用）
+
+        Returns:
+            int: 去除 PKCS7 填充后的明文长度
+
+        Raises:
+            ValueError: 密钥未设置或解密失败
+        """
+        if not key:
+            raise ValueError("解密密钥未设置")
+
+        if iv is None:
+            iv = self.generate_iv_from_sequence(sequence_number)
+
+        size = len(data)
+        if size == 0:
+            return 0
+
+        if shared_memory is None or size < SHARED_MEMORY_THRESHOLD:
             try:
-                decrypted_data = unpad(decrypted_data, AES.block_size)
-            except ValueError:
-                # 某些流可能没有标准填充，直接返回
-                pass
-            return decrypted_data
+                plain = pool.submit(_decrypt_worker, key, iv, bytes(data)).result()
+            except Exception as e:
+                self.logger.error(f"解密失败: {e}")
+                raise ValueError(f"解密失败: {e}")
+            data[:len(plain)] = plain
+            return len(plain)
+
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            shm.buf[:size] = data
+            plain_size = pool.submit(
+                _decrypt_shared_worker, key, iv, shm.name, size).result()
+            data[:plain_size] = shm.buf[:plain_size]
+            return plain_size
 
         except Exception as e:
             self.logger.error(f"解密失败: {e}")
             raise ValueError(f"解密失败: {e}")
+        finally:
+            shm.close()
+            shm.unlink()
+
+    @staticmethod
+    def _unpadded_length(data, size: int) -> int:
+        """
+        计算去除 PKCS7 填充后的长度
+
+        某些流可能没有标准填充，此时返回原长度
+        """
+        if size == 0:
+            return 0
+        pad = data[size - 1]
+        if 1 <= pad <= 16 and pad <= size:
+            padding = _PKCS7_PADDINGS[pad]
+            if isinstance(data, memoryview):
+                # memoryview 切片不复制数据
+                valid = data[size - pad:size] == padding
+            else:
+                valid = data.endswith(padding, 0, size)
+            if valid:
+                return size - pad
+        return size
+
+
+class CBCStreamDecryptor:
+    """
+    AES-CBC 分块解密器
+
+    CBC 解密状态在多次 update_into 之间延续，每次传入的数据长度必须是分组大小的整数倍。
+    PKCS7 填充只在最后一个分组中，由 finalize 去除
+    """
+
+    def __init__(self, context):
+        """
+        Args:
+            context: OpenSSL EVP 解密上下文，或 pycryptodome 的 CBC 对象
+        """
+        self._context = context
+        self._evp = hasattr(context, 'update_into')
+
+    def update_into(self, view: memoryview):
+        """
+        原地解密一段密文
+
+        Args:
+            view: 可写的 memoryview，长度为分组大小的整数倍
+        """
+        size = len(view)
+        if size % _AES_BLOCK_SIZE:
+            raise ValueError(f"密文长度不是 {_AES_BLOCK_SIZE} 的整数倍: {size}")
+        if not size:
+            return
+        if self._evp:
+            # update_into 要求输出比输入多留一个分组，最后一个分组单独解密
+            body = size - _AES_BLOCK_SIZE
+            if body:
+                self._context.update_into(view[:body], view)
+            view[body:] = self._context.update(view[body:])
+        else:
+            self._context.decrypt(view, output=view)
+
+    def finalize(self, last_block) -> bytes:
+        """
+        结束解密并去除填充
+
+        Args:
+            last_block: 已解密的最后一个分组（调用方在数据结束前暂不写出）
+
+        Returns:
+            bytes: 去除 PKCS7 填充后的最后一个分组
+        """
+        if self._evp:
+            self._context.finalize()
+        size = len(last_block)
+        return bytes(last_block[:AESDecryptor._unpadded_length(last_block, size)])
+
+
+def _evp_decrypt_into(algorithm, iv: bytes, src, dst, size: int):
+    """
+    使用 OpenSSL EVP 解密到 dst（不处理填充，填充由 _unpadded_length 计算）
+
+    update_into 要求输出缓冲区比输入多留一个分组，因此先解密除最后一个分组
+    以外的数据，再单独解密最后一个分组，这样 dst 与 src 相同时也能原地解密
+    """
+    decryptor = Cipher(algorithm, modes.CBC(iv)).decryptor()
+    body = max(size - _AES_BLOCK_SIZE, 0)
+    with memoryview(src) as src_view, memoryview(dst) as dst_view:
+        if body:
+            decryptor.update_into(src_view[:body], dst_view)
+        dst_view[body:size] = decryptor.update(src_view[body:size])
+    decryptor.finalize()
+
+
+def init_decrypt_worker():
+    """
+    解密进程初始化函数
+
+    进程启动时导入本模块并预热一次解密后端，首个片段不再承担导入和初始化开销
+    """
+    _decrypt_worker(bytes(16), bytes(16), bytes(16))
+
+
+def _decrypt_worker(key: bytes, iv: bytes, data: bytes) -> bytearray:
+    """进程池解密任务：解密传入的数据，返回去除填充后的明文"""
+    _import_crypto()
+    buf = bytearray(data)
+    size = len(buf)
+    if EVP_AVAILABLE:
+        _evp_decrypt_into(algorithms.AES(key), iv, buf, buf, size)
+    else:
+        AES.new(key, AES.MODE_CBC, iv).decrypt(buf, output=buf)
+    del buf[AESDecryptor._unpadded_length(buf, size):]
+    return buf
+
+
+def _decrypt_shared_worker(key: bytes, iv: bytes, shm_name: str, size: int) -> int:
+    """进程池解密任务：在共享内存上原地解密，返回明文长度"""
+    _import_crypto()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = shm.buf[:size]
+        try:
+            if EVP_AVAILABLE:
+                _evp_decrypt_into(algorithms.AES(key), iv, buf, buf, size)
+            else:
+                AES.new(key, AES.MODE_CBC, iv).decrypt(buf, output=buf)
+            return AESDecryptor._unpadded_length(buf, size)
+        finally:
+            buf.release()
+    finally:
+        shm.close()
 
 
 class CryptoHelper:
@@ -302,6 +843,7 @@ class CryptoHelper:
         """检查依赖状态"""
         deps = {
             'pycryptodome': CRYPTO_AVAILABLE,
+            'cryptography': EVP_AVAILABLE,
         }
         return deps
 
@@ -4,12 +4,60 @@
 """
 
 import os
+import time
+import queue
 import threading
-from typing import Optional, Dict, Any
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, Tuple
 from .crypto import EncryptionInfo
 from .config import DownloadConfig
 from .progress import SegmentProgressTracker
-from .utils import RetryHandler, create_session, check_ts_header, extract_filename
+from .utils import (
+    RetryHandler, create_session, mount_connection_pool, check_ts_header, is_ts_data,
+    extract_filename,
+    TS_HEADER_SAMPLE_SIZE
+)
+
+# 片段缓冲区池：复用下载加密片段用的 bytearray，避免每个片段都重新分配大块内存
+# 池中最多保留 32 个缓冲区，按 2MB 的片段计算约占用 64MB。
+# 仅用于解密进程池路径（decrypt_processes != 0，整个片段下载完再交给进程池解密）；
+# 默认配置（decrypt_processes == 0）边下载边解密，使用线程本地的读缓冲区，不经过这里
+_BUF_POOL: "queue.LifoQueue[bytearray]" = queue.LifoQueue(maxsize=32)
+
+# 不超过该大小的加密片段一次读完整个响应体，更大的片段按 chunk_size 分块读取
+_WHOLE_READ_LIMIT = 4 * 1024 * 1024
+
+
+def _acquire_buf(size: int) -> bytearray:
+    """从缓冲区池取出一个长度为 size 的 bytearray（内容未清零），池为空时新建"""
+    try:
+        buf = _BUF_POOL.get_nowait()
+    except queue.Empty:
+        return bytearray(size)
+    if len(buf) < size:
+        buf.extend(bytes(size - len(buf)))
+    else:
+        del buf[size:]
+    return buf
+
+
+def _release_buf(buf: bytearray):
+    """把缓冲区放回池中，池已满时直接丢弃"""
+    try:
+        _BUF_POOL.put_nowait(buf)
+    except queue.Full:
+        pass
+
+
+def _sync_file(f):
+    """把文件数据写入磁盘；只需要数据落盘，支持时用 fdatasync 省去时间戳等元数据的同步"""
+    f.flush()
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(f.fileno())
+    else:
+        os.fsync(f.fileno())
 
 
 class DownloadHandler:
@@ -19,23 +67,166 @@ class DownloadHandler:
         self.config = config
         self.logger = logger  # 添加logger属性
         self.session = create_session(
-            self.config.verify_ssl, self.config.headers)
+            self.config.verify_ssl, self.config.headers, self.config.pool_maxsize)
+        self._pool_maxsize = self.config.pool_maxsize
         # 重试处理器
         self.retry_handler = RetryHandler(
             max_retries=self.config.max_retries,
             retry_delay=self.config.retry_delay
         )
+        # 中断事件：收到中断信号后，正在进行的下载在下一个数据块处终止
+        self._abort_event = threading.Event()
+        # 每个下载线程复用自己的读缓冲区（见 _read_buffer）
+        self._local = threading.local()
         # 加密相关组件
         self._decryptor = None
+        # 解密进程池（按需创建）
+        self._decrypt_pool = None
+        self._decrypt_pool_lock = threading.Lock()
+        # 任务名 -> (密钥内容, 过期时间)，避免每个片段都重新读取密钥缓存文件
+        # 按最近使用顺序排列，超过 key_memory_cache_size 时淘汰最久未用的任务
+        self._key_bytes_cache: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._key_cache_lock = threading.Lock()
+        # 自定义密钥 / IV 在整个下载过程中不变，只读取、解析一次
+        self._custom_key = self.config.get_custom_key()
+        self._custom_iv = self.config.get_custom_iv()
         # 初始化加密组件（如果启用）
         if self.config.auto_decrypt and self._is_crypto_available():
             from .crypto import KeyManager, AESDecryptor
             key_manager = KeyManager(
                 cache_dir=self.config.key_cache_dir,
-                cache_ttl=self.config.key_cache_ttl
+                cache_ttl=self.config.key_cache_ttl,
+                session=self.session,
+                memory_cache_size=self.config.key_memory_cache_size
             )
             self._decryptor = AESDecryptor(key_manager)
 
+    def ensure_pool_size(self, max_concurrent: int):
+        """
+        按并发任务数放大连接池
+
+        批量下载时所有任务的片段共用这个会话，连接池小于同时下载的线程数时
+        urllib3 会丢弃多出的连接（Connection pool is full），长连接无法复用
+
+        Args:
+            max_concurrent: 最大并发任务数
+        """
+        needed = self.config.pool_maxsize * max(1, max_concurrent)
+        if needed > self._pool_maxsize:
+            mount_connection_pool(self.session, needed)
+            self._pool_maxsize = needed
+
+    def abort(self):
+        """中断所有正在进行的下载"""
+        self._abort_event.set()
+
+    def reset_abort(self):
+        """清除中断状态"""
+        self._abort_event.clear()
+
+    def set_task_key(self, task_name: str, key: bytes):
+        """记录任务的解密密钥"""
+        expires = time.monotonic() + self.config.key_cache_ttl
+        with self._key_cache_lock:
+            self._key_bytes_cache[task_name] = (key, expires)
+            self._key_bytes_cache.move_to_end(task_name)
+            while len(self._key_bytes_cache) > self.config.key_memory_cache_size:
+                self._key_bytes_cache.popitem(last=False)
+
+    def get_task_key(self, task_name: str) -> Optional[bytes]:
+        """
+        获取任务的解密密钥
+
+        配置了自定义密钥时直接使用；否则优先使用内存中未过期的密钥，
+        没有时读取一次密钥缓存文件并记住结果
+
+        Args:
+            task_name: 任务名称
+
+        Returns:
+            Optional[bytes]: 密钥内容，缓存文件不存在时返回 None
+        """
+        if self._custom_key:
+            return self._custom_key
+
+        with self._key_cache_lock:
+            entry = self._key_bytes_cache.get(task_name)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._key_bytes_cache.move_to_end(task_name)
+                    return entry[0]
+                del self._key_bytes_cache[task_name]
+
+        # 密钥仍在后台下载时等待下载完成
+        future = self._decryptor.key_manager.get_pending(task_name)
+        if future is not None:
+            key = future.result()
+            if key is not None:
+                self.set_task_key(task_name, key)
+                return key
+
+        # 直接打开，不存在时由异常判断，省去一次 stat
+        cache_path = self._decryptor.key_manager.get_cache_path(task_name)
+        try:
+            with open(cache_path, 'rb') as f:
+                key = f.read()
+        except FileNotFoundError:
+            return None
+        self.set_task_key(task_name, key)
+        return key
+
+    def clear_task_keys(self):
+        """清除内存中的任务密钥及对应的解密上下文"""
+        with self._key_cache_lock:
+            self._key_bytes_cache.clear()
+        if self._decryptor is not None:
+            self._decryptor.clear_schedules()
+
+    def _get_decrypt_pool(self):
+        """获取解密进程池，未启用时返回 None"""
+        if self.config.decrypt_processes == 0:
+            return None
+        with self._decrypt_pool_lock:
+            if self._decrypt_pool is None:
+                from .crypto import init_decrypt_worker
+                # 小于 0 时按 CPU 核心数创建
+                max_workers = self.config.decrypt_processes
+                if max_workers < 0:
+                    max_workers = multiprocessing.cpu_count()
+                # 下载线程已在运行，fork 出的子进程可能继承被其他线程持有的锁，
+                # 因此使用 spawn 启动工作进程
+                self._decrypt_pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_decrypt_worker)
+            return self._decrypt_pool
+
+    def shutdown(self):
+        """释放解密进程池和密钥预取线程"""
+        if self._decryptor is not None:
+            self._decryptor.key_manager.shutdown()
+        with self._decrypt_pool_lock:
+            if self._decrypt_pool is not None:
+                self._decrypt_pool.shutdown(wait=True)
+                self._decrypt_pool = None
+
+    def _read_buffer(self) -> memoryview:
+        """
+        获取当前线程复用的读缓冲区
+
+        长度为 chunk_size 加两个 AES 分组（边下载边解密时开头要存放上次剩下的密文）。
+        下载线程池中的线程在片段和任务之间复用，每个线程只分配一次，
+        占用的内存不随片段数增长，只取决于线程数
+
+        Returns:
+            memoryview: 可写缓冲区
+        """
+        view = getattr(self._local, 'view', None)
+        if view is None:
+            view = memoryview(bytearray(self.config.chunk_size + 32))
+            self._local.view = view
+        return view
+
     def _is_crypto_available(self):
         """检查加密库是否可用"""
         try:
@@ -52,10 +243,16 @@ class DownloadHandler:
                 enc_info
         )
 
-    def _decrypt_segment(self, key: bytes, data: bytes, segment_index: int,
-                         enc_info: Optional[EncryptionInfo] = None) -> bytes:
+    def _segment_iv(self, enc_info: EncryptionInfo) -> Optional[bytes]:
+        """获取片段的解密 IV；没有显式 IV 时返回 None，由解密器根据序列号生成"""
+        if self._custom_iv:
+            return self._custom_iv
+        return enc_info.iv
+
+    def _decrypt_segment(self, key: bytes, data: bytearray, segment_index: int,
+                         enc_info: Optional[EncryptionInfo] = None) -> bytearray:
         """
-        解密片段数据
+        解密片段数据（在 data 上原地解密，不额外分配明文缓冲区）
 
         Args:
             key: 解密密钥
@@ -63,25 +260,25 @@ class DownloadHandler:
             segment_index: 片段索引
 
         Returns:
-            bytes: 解密后的数据
+            bytearray: 解密后的数据（即传入的 data，已去除填充）
         """
         if not self._should_decrypt(enc_info):
             return data
 
         try:
-            from .crypto import AESDecryptor
             # 计算实际序列号
             sequence_number = getattr(self, '_media_sequence', 0) + segment_index
-            custom_iv = self.config.get_custom_iv()
-            if custom_iv:
-                iv = custom_iv
-            elif enc_info.iv is not None:
-                iv = enc_info.iv
-            else:
-                # 没有显式IV，传递None让decrypt方法根据sequence_number生成
-                iv = None
+            iv = self._segment_iv(enc_info)
 
-            return self._decryptor.decrypt(data, key, iv=iv, sequence_number=sequence_number)
+            pool = self._get_decrypt_pool()
+            if pool is not None:
+                size = self._decryptor.decrypt_in_pool(
+                    pool, data, key, iv=iv, sequence_number=sequence_number)
+            else:
+                size = self._decryptor.decrypt_into(
+                    data, data, key, iv=iv, sequence_number=sequence_number)
+            del data[size:]
+            return data
 
         except Exception as e:
             error_msg = f"解密失败: {e}, segment_index={segment_index}, sequence_number={sequence_number}"
@@ -93,7 +290,7 @@ class DownloadHandler:
             raise ValueError(error_msg)
 
     def download_file_stream(self, url: str, save_path: str, filename: str, task_name: str, segment_index: int = 0,
-                             enc_info: Optional[EncryptionInfo] = None) -> Dict[str, Any]:
+                             enc_info: Optional[EncryptionInfo] = None, known_missing: bool = False) -> Dict[str, Any]:
         """
         下载单个文件（流式，实时更新进度）
 
@@ -104,6 +301,7 @@ class DownloadHandler:
             task_name: 任务名称（用于显示）
             segment_index: 片段索引（用于 IV 计算）
             enc_info: 加密信息
+            known_missing: 调用方已扫描过目录、确认没有有效的同名文件时传 True，跳过存在性检查
 
         Returns:
             Dict[str, Any]: 包含下载结果和错误信息的字典
@@ -114,9 +312,17 @@ class DownloadHandler:
         """
         filepath = os.path.join(save_path, filename)
 
-        # 检查文件是否已存在
-        if os.path.exists(filepath):
-            # 验证已存在的文件是否有效
+        if self._abort_event.is_set():
+            return {
+                "success": False,
+                "filename": filename,
+                "url": url,
+                "error": "下载已取消"
+            }
+
+        # 检查文件是否已存在且有效（调用方已确认不存在时跳过）；
+        # check_ts_header 打开失败即视为不存在，不再单独 stat
+        if not known_missing:
             if check_ts_header(filepath):
                 if self.logger:
                     self.logger.info(f"{task_name}: {filename} 已存在，跳过")
@@ -126,12 +332,11 @@ class DownloadHandler:
                     "url": url,
                     "error": None
                 }
-            else:
-                # 文件存在但无效，删除并重新下载
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
+            # 文件不存在或无效，删除后重新下载（写入时也会覆盖）
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
 
         try:
             # 使用重试机制下载
@@ -146,47 +351,56 @@ class DownloadHandler:
 
                 # 获取文件大小
                 total_size = int(response.headers.get('content-length', 0))
-                downloaded_size = 0
-                chunks = []
-
-                # 分块下载
-                for chunk in response.iter_content(chunk_size=self.config.chunk_size):
-                    if chunk:
-                        chunks.append(chunk)
-                        downloaded_size += len(chunk)
-
-                # 合并数据
-                data = b''.join(chunks)
 
-                # 如果启用解密且有加密信息，解密数据
-                if self._should_decrypt(enc_info):
-                    # 读取密钥缓存文件
-                    cache_path = self._decryptor.key_manager.get_cache_path(task_name)
+                # 直接从底层连接读取到本线程复用的缓冲区，避免 iter_content 每块分配新对象，
+                # 也不必每个片段都重新分配缓冲区
+                raw = response.raw
+                raw.decode_content = True
+                view = self._read_buffer()[:self.config.chunk_size]
 
-                    if os.path.exists(cache_path):
-                        try:
-                            # 读取密钥内容
-                            with open(cache_path, 'rb') as f:
-                                key_content = f.read()
-
-                            # 解密数据（如果解密失败会抛出异常）
-                            data = self._decrypt_segment(key_content, data, segment_index, enc_info)
-                            # 解密后立即验证数据是否有效（检查TS头部）
-                            if len(data) < 4 or data[0] != 0x47:
-                                if self.logger:
-                                    self.logger.warning(f"解密后的数据不是有效的TS格式: 第一个字节=0x{data[0]:02X if len(data) > 0 else 0}")
+                if not self._should_decrypt(enc_info):
+                    if self.logger:
+                        self.logger.info(f"文件没有加密: {task_name}: {filename}")
 
-                        except Exception as e:
-                            error_msg = f"解密失败: {e}, segment_index={segment_index}"
-                            if self.logger:
-                                self.logger.error(f"{task_name}: {filename} - {error_msg}")
+                    # 不需要解密：边下载边写入临时文件，完成后再改名，避免留下不完整的片段
+                    part_path = filepath + '.part'
+                    # 记下文件开头用于TS头部校验，写完后不必再打开文件读取
+                    head = bytearray()
+                    try:
+                        with open(part_path, 'wb', buffering=self.config.buffer_size) as f:
+                            while not self._abort_event.is_set():
+                                n = raw.readinto(view)
+                                if not n:
+                                    break
+                                if len(head) < TS_HEADER_SAMPLE_SIZE:
+                                    head += view[:min(n, TS_HEADER_SAMPLE_SIZE - len(head))]
+                                f.write(view[:n])
+                            if self.config.fsync_segments and not self._abort_event.is_set():
+                                _sync_file(f)
+                        if self._abort_event.is_set():
+                            # 直接关闭连接并返回失败结果，不触发重试
+                            response.close()
+                            os.remove(part_path)
                             return {
                                 "success": False,
                                 "filename": filename,
                                 "url": url,
-                                "error": error_msg
+                                "error": "下载已取消"
                             }
-                    else:
+                        os.replace(part_path, filepath)
+                        valid_ts = is_ts_data(head)
+                    except Exception:
+                        try:
+                            os.remove(part_path)
+                        except FileNotFoundError:
+                            pass
+                        raise
+                elif self._get_decrypt_pool() is None:
+                    # 需要解密且不使用解密进程池：边下载边解密，解密与网络读取重叠进行
+                    key_content = self.get_task_key(task_name)
+                    if key_content is None:
+                        response.close()
+                        cache_path = self._decryptor.key_manager.get_cache_path(task_name)
                         error_msg = f"密钥缓存文件不存在: {cache_path}"
                         if self.logger:
                             self.logger.error(f"{task_name}: {filename} - {error_msg}")
@@ -196,19 +410,159 @@ class DownloadHandler:
                             "url": url,
                             "error": error_msg
                         }
-                else:
-                    if self.logger:
-                        self.logger.info(f"文件没有加密: {task_name}: {filename}")
+                    sequence_number = getattr(self, '_media_sequence', 0) + segment_index
+                    try:
+                        stream = self._decryptor.stream_decryptor(
+                            key_content, self._segment_iv(enc_info), sequence_number)
+                    except Exception as e:
+                        response.close()
+                        error_msg = f"解密失败: {e}, segment_index={segment_index}"
+                        if self.logger:
+                            self.logger.error(f"{task_name}: {filename} - {error_msg}")
+                        return {
+                            "success": False,
+                            "filename": filename,
+                            "url": url,
+                            "error": error_msg
+                        }
 
-                # 写入文件并确保数据完全写入磁盘
-                with open(filepath, 'wb') as f:
-                    f.write(data)
-                    # 强制刷新缓冲区，确保数据写入磁盘
-                    f.flush()
-                    os.fsync(f.fileno())
+                    # 缓冲区开头存放上次剩下的不足一个分组的密文，因此多留两个分组的空间
+                    chunk_size = self.config.chunk_size
+                    sview = self._read_buffer()
+                    carry = 0
+                    # 最后一个分组带有填充，数据结束前始终留住最近解密的一个分组不写出
+                    held = b''
+                    head = bytearray()
+                    part_path = filepath + '.part'
+                    try:
+                        with open(part_path, 'wb', buffering=self.config.buffer_size) as f:
+                            while not self._abort_event.is_set():
+                                n = raw.readinto(sview[carry:carry + chunk_size])
+                                if not n:
+                                    break
+                                total = carry + n
+                                aligned = total & ~15
+                                if aligned:
+                                    stream.update_into(sview[:aligned])
+                                    if len(head) < TS_HEADER_SAMPLE_SIZE:
+                                        head += sview[:min(aligned, TS_HEADER_SAMPLE_SIZE - len(head))]
+                                    if held:
+                                        f.write(held)
+                                    f.write(sview[:aligned - 16])
+                                    held = bytes(sview[aligned - 16:aligned])
+                                carry = total - aligned
+                                if carry and aligned:
+                                    # 剩余的密文移到缓冲区开头，与下一块数据拼接
+                                    sview[:carry] = sview[aligned:total]
+                            if not self._abort_event.is_set():
+                                if carry:
+                                    # 数据不完整，抛出异常交给重试机制重新下载
+                                    raise ValueError(
+                                        f"解密失败: 密文长度不是16的整数倍, segment_index={segment_index}")
+                                f.write(stream.finalize(held))
+                                if self.config.fsync_segments:
+                                    _sync_file(f)
+                        if self._abort_event.is_set():
+                            # 直接关闭连接并返回失败结果，不触发重试
+                            response.close()
+                            os.remove(part_path)
+                            return {
+                                "success": False,
+                                "filename": filename,
+                                "url": url,
+                                "error": "下载已取消"
+                            }
+                        os.replace(part_path, filepath)
+                        valid_ts = is_ts_data(head)
+                    except Exception:
+                        try:
+                            os.remove(part_path)
+                        except FileNotFoundError:
+                            pass
+                        raise
+                else:
+                    # 需要解密且使用解密进程池（decrypt_processes != 0）：
+                    # 分块下载到同一个缓冲区，解密时原地进行
+                    # 已知长度且未压缩时按 Content-Length 预先分配，数据直接读入该缓冲区
+                    presized = total_size > 0 and response.headers.get(
+                        'content-encoding', 'identity') == 'identity'
+                    data = _acquire_buf(total_size) if presized else bytearray()
+                    read_size = total_size if total_size <= _WHOLE_READ_LIMIT else self.config.chunk_size
+                    try:
+                        received = 0
+                        while True:
+                            if self._abort_event.is_set():
+                                # 直接关闭连接并返回失败结果，不触发重试
+                                response.close()
+                                return {
+                                    "success": False,
+                                    "filename": filename,
+                                    "url": url,
+                                    "error": "下载已取消"
+                                }
+                            if presized:
+                                if received == total_size:
+                                    break
+                                with memoryview(data) as data_view:
+                                    n = raw.readinto(
+                                        data_view[received:received + read_size])
+                            else:
+                                n = raw.readinto(view)
+                                if n:
+                                    data += view[:n]
+                            if not n:
+                                break
+                            received += n
+                        if presized and received < total_size:
+                            del data[received:]
+
+                        # 获取任务密钥
+                        key_content = self.get_task_key(task_name)
+
+                        if key_content is not None:
+                            try:
+                                # 解密数据（如果解密失败会抛出异常）
+                                data = self._decrypt_segment(key_content, data, segment_index, enc_info)
+                                # 解密后立即验证数据是否有效（检查TS头部）
+                                if len(data) < 4 or data[0] != 0x47:
+                                    if self.logger:
+                                        self.logger.warning(f"解密后的数据不是有效的TS格式: 第一个字节=0x{data[0]:02X if len(data) > 0 else 0}")
+
+                            except Exception as e:
+                                error_msg = f"解密失败: {e}, segment_index={segment_index}"
+                                if self.logger:
+                                    self.logger.error(f"{task_name}: {filename} - {error_msg}")
+                                return {
+                                    "success": False,
+                                    "filename": filename,
+                                    "url": url,
+                                    "error": error_msg
+                                }
+                        else:
+                            cache_path = self._decryptor.key_manager.get_cache_path(task_name)
+                            error_msg = f"密钥缓存文件不存在: {cache_path}"
+                            if self.logger:
+                                self.logger.error(f"{task_name}: {filename} - {error_msg}")
+                            return {
+                                "success": False,
+                                "filename": filename,
+                                "url": url,
+                                "error": error_msg
+                            }
 
-                # 验证文件是否有效TS格式（双重检查）
-                if not check_ts_header(filepath):
+                        # 写入文件；异常退出后不完整的片段会在TS头部校验时被重新下载，
+                        # 因此默认不逐个 fsync，只在合并输出后 fsync 一次
+                        with open(filepath, 'wb') as f:
+                            f.write(data)
+                            if self.config.fsync_segments:
+                                _sync_file(f)
+                        valid_ts = is_ts_data(data)
+                    finally:
+                        if presized:
+                            _release_buf(data)
+
+                # 验证文件是否有效TS格式（双重检查，使用写入时留在内存中的数据）
+                if not valid_ts:
                     # 如果文件无效，删除它
                     try:
                         os.remove(filepath)
@@ -3,6 +3,14 @@ from typing import List
 import os
 from .download import DownloadTask
 
+try:
+    # 可选：orjson 解析 / 序列化速度明显快于标准库 json
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 class JSONTaskLoader:
     """JSON任务加载器"""
 
@@ -32,11 +40,15 @@ class JSONTaskLoader:
         Returns:
             List[DownloadTask]: 任务列表
         """
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"JSON文件不存在: {file_path}")
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        try:
+            if ORJSON_AVAILABLE:
+                with open(file_path, 'rb') as f:
+                    data = orjson.loads(f.read())
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"JSON文件不存在: {file_path}") from None
 
         tasks = []
         for item in data:
@@ -60,6 +72,10 @@ class JSONTaskLoader:
     def save_to_file(tasks: List[DownloadTask], file_path: str):
         """保存任务列表到JSON文件"""
         data = [task.to_dict() for task in tasks]
+        if ORJSON_AVAILABLE:
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            return
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
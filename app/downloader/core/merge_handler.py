@@ -4,11 +4,94 @@
 """
 
 import os
+import mmap
+import shutil
+import functools
+import tempfile
 import subprocess
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from tqdm import tqdm
 from .config import DownloadConfig
-from .utils import check_ts_header
+from .utils import check_ts_header, extract_filename
+
+
+# 二进制合并时读写使用的最小缓冲区大小：合并是大文件顺序读写，
+# 缓冲区越大 read/write 系统调用越少（配置中的 buffer_size 更大时以配置为准）
+MERGE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# 二进制合并按片段平均大小选择缓冲区时的上下限
+ADAPTIVE_BUFFER_MIN = 256 * 1024
+ADAPTIVE_BUFFER_MAX = 16 * 1024 * 1024
+
+
+def _fadvise(fd: int, advice_name: str):
+    """向内核提示文件的访问方式（平台不支持时忽略）"""
+    advice = getattr(os, advice_name, None)
+    if advice is None:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+    except OSError:
+        pass
+
+
+# 合并前校验片段时，片段数达到该值才使用线程池并行校验
+_PARALLEL_VALIDATE_THRESHOLD = 64
+
+# 并行校验片段的线程数
+_VALIDATE_WORKERS = 16
+
+# concat 协议的输入作为单个命令行参数传给 FFmpeg，超过该长度时改用列表文件
+# （Windows 命令行总长度上限为 32767 个字符）
+_CONCAT_PROTOCOL_MAX_LEN = 30000
+
+# os.open 在 Windows 下默认以文本模式打开（转换换行、遇 0x1A 视为结尾），读写片段必须带上
+_O_BINARY = getattr(os, 'O_BINARY', 0)
+
+
+def _prefetch_file(path: str):
+    """请求内核异步预读整个文件到页缓存（不等待读取完成，失败时忽略）"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY | _O_BINARY)
+    except OSError:
+        return
+    try:
+        _fadvise(fd, 'POSIX_FADV_WILLNEED')
+    finally:
+        os.close(fd)
+
+
+def _write_all(fd: int, data):
+    """
+    把 data 完整写入文件描述符
+
+    输出文件以无缓冲方式打开，os.write 可能只写入一部分，循环直到全部写完
+
+    Args:
+        fd: 输出文件描述符
+        data: 支持缓冲区协议的对象（bytes / memoryview / mmap）
+    """
+    with memoryview(data) as view:
+        size = len(view)
+        offset = 0
+        while offset < size:
+            offset += os.write(fd, view[offset:])
+
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_available() -> bool:
+    """检查 FFmpeg 是否可用（每个进程只检查一次，不再每次合并都启动一个 ffmpeg 进程）"""
+    try:
+        subprocess.run(['ffmpeg', '-version'],
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL,
+                       check=True)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
 
 
 class MergeHandler:
@@ -17,16 +100,237 @@ class MergeHandler:
     def __init__(self, config: DownloadConfig, logger=None):
         self.config = config
         self.logger = logger
+        # sendfile 写普通文件失败过一次后，后续文件直接使用普通复制
+        self._use_sendfile = hasattr(os, 'sendfile')
+        # copy_file_range（Linux 4.5+，Python 3.8+）同样在内核中拷贝，失败过一次后不再尝试
+        self._use_copy_file_range = hasattr(os, 'copy_file_range')
+        self._merge_buffer_size = max(self.config.buffer_size, MERGE_BUFFER_SIZE)
 
     def _extract_filename(self, url: str) -> str:
-        """从URL提取文件名"""
-        return os.path.basename(url.split('?')[0])
+        """从URL提取文件名（与下载时保存的文件名规则一致）"""
+        return extract_filename(url)
 
     def _safe_print(self, message: str, quiet_mode=False):
         """安全的打印函数"""
         if not quiet_mode:
             print(message)
 
+    def _append_file(self, outfile, filepath: str, buffer_size: Optional[int] = None):
+        """
+        把文件内容追加到输出文件末尾
+
+        优先使用 copy_file_range，其次 sendfile，在内核中直接拷贝，数据不经过用户空间；
+        否则通过 mmap 写入，都不可用时按缓冲区大小分块复制
+
+        Args:
+            outfile: 以二进制写模式打开的输出文件
+            filepath: 要追加的文件路径
+            buffer_size: 分块复制时的缓冲区大小，默认使用 _merge_buffer_size
+        """
+        # 直接使用文件描述符，sendfile 不需要 Python 文件对象
+        fd = os.open(filepath, os.O_RDONLY | _O_BINARY)
+        # 片段从头到尾只读一次：加大预读，读完后释放页缓存，不挤占后续步骤需要的缓存
+        _fadvise(fd, 'POSIX_FADV_SEQUENTIAL')
+        try:
+            if self._use_copy_file_range:
+                outfile.flush()
+                out_fd = outfile.fileno()
+                size = os.fstat(fd).st_size
+                copied = 0
+                try:
+                    # 输入输出都是普通文件：在内核中拷贝，支持的文件系统上还可以直接共享数据块
+                    while copied < size:
+                        n = os.copy_file_range(fd, out_fd, size - copied)
+                        if n == 0:
+                            break
+                        copied += n
+                    return
+                except OSError:
+                    # 内核或文件系统不支持（如较旧内核上跨文件系统拷贝），尚未写入任何数据时改用 sendfile
+                    if copied:
+                        raise
+                    self._use_copy_file_range = False
+            if self._use_sendfile:
+                outfile.flush()
+                out_fd = outfile.fileno()
+                size = os.fstat(fd).st_size
+                offset = 0
+                try:
+                    while offset < size:
+                        sent = os.sendfile(out_fd, fd, offset, size - offset)
+                        if sent == 0:
+                            break
+                        offset += sent
+                    return
+                except OSError:
+                    # 部分平台的 sendfile 不支持写入普通文件，尚未写入任何数据时回退到普通复制
+                    if offset:
+                        raise
+                    self._use_sendfile = False
+            # 不能用 sendfile 时把文件映射到内存整体写入，不再按块读出新的 bytes 对象
+            try:
+                mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # 空文件无法映射，或文件系统不支持 mmap
+                mapped = None
+            out_fd = outfile.fileno()
+            if mapped is not None:
+                with mapped:
+                    _write_all(out_fd, mapped)
+                return
+            # 都不可用时分块复制，读入复用的缓冲区
+            buf = bytearray(buffer_size or self._merge_buffer_size)
+            with open(fd, 'rb', buffering=0, closefd=False) as infile, memoryview(buf) as view:
+                while True:
+                    n = infile.readinto(view)
+                    if not n:
+                        break
+                    _write_all(out_fd, view[:n])
+        finally:
+            _fadvise(fd, 'POSIX_FADV_DONTNEED')
+            os.close(fd)
+
+    @staticmethod
+    def _segments_size(temp_dir: str, filenames: List[str]) -> int:
+        """
+        计算片段的总大小（一次 scandir 遍历目录，不存在的片段不计入）
+
+        Args:
+            temp_dir: 临时目录路径
+            filenames: 片段文件名
+
+        Returns:
+            int: 总字节数，目录无法读取时返回 0
+        """
+        names = set(filenames)
+        total = 0
+        try:
+            with os.scandir(temp_dir) as it:
+                for entry in it:
+                    if entry.name in names:
+                        total += entry.stat().st_size
+        except OSError:
+            return 0
+        return total
+
+    def _adaptive_buffer_size(self, total_size: int, count: int) -> int:
+        """
+        按片段平均大小选择分块复制的缓冲区大小
+
+        一个片段通常一次读完；限制在 ADAPTIVE_BUFFER_MIN 到 ADAPTIVE_BUFFER_MAX 之间，
+        无法得到片段大小时使用 _merge_buffer_size
+
+        Args:
+            total_size: 片段总字节数
+            count: 片段数量
+
+        Returns:
+            int: 缓冲区大小
+        """
+        if total_size <= 0 or count <= 0:
+            return self._merge_buffer_size
+        return max(ADAPTIVE_BUFFER_MIN, min(ADAPTIVE_BUFFER_MAX, total_size // count))
+
+    @staticmethod
+    def _preallocate(fd: int, size: int):
+        """为输出文件预先分配磁盘空间（平台或文件系统不支持时忽略）"""
+        if size <= 0 or not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass
+
+    def _fsync_file(self, path: str):
+        """把合并输出写入磁盘（片段写入时不再逐个 fsync）"""
+        try:
+            # Windows 上 fsync 对应 _commit，只读描述符会返回 EBADF，因此以读写方式打开
+            fd = os.open(path, os.O_RDWR | _O_BINARY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"同步输出文件 {path} 失败: {e}")
+
+    def _remove_segments(self, temp_dir: str, filenames: List[str]):
+        """
+        合并成功后删除片段文件和临时目录
+
+        一次 scandir 遍历目录，只对实际存在的片段（以及中断下载留下的 .part 文件）执行删除，
+        不再逐个 URL 拼接路径并尝试删除；目录中没有其他文件时随后删除目录
+
+        Args:
+            temp_dir: 临时目录路径
+            filenames: 本次合并的片段文件名
+        """
+        names = set(filenames)
+        try:
+            with os.scandir(temp_dir) as it:
+                entries = [entry for entry in it
+                           if entry.name in names
+                           or (entry.name.endswith('.part') and entry.name[:-5] in names)]
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"删除临时文件 {entry.name} 失败: {e}")
+        try:
+            os.rmdir(temp_dir)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"删除临时目录 {temp_dir} 失败: {e}")
+
+    def _run_ffmpeg_with_pipe(self, cmd: List[str], paths: List[str]):
+        """
+        启动 FFmpeg 并把片段依次写入它的标准输入
+
+        stderr 写入临时文件而不是管道，即使 FFmpeg 输出大量错误信息，
+        也不会在向 stdin 写数据时因 stderr 管道写满而互相等待。
+        写入当前片段前先提示内核预读下一个片段，不需要额外的读线程
+
+        Args:
+            cmd: 从 pipe:0 读取输入的 FFmpeg 命令
+            paths: 按合并顺序排列的片段路径
+
+        Raises:
+            subprocess.CalledProcessError: FFmpeg 返回非零退出码
+        """
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                    stdout=subprocess.DEVNULL, stderr=stderr_file)
+            try:
+                last = len(paths) - 1
+                for i, path in enumerate(paths):
+                    with open(path, 'rb', buffering=0) as infile:
+                        # 写当前片段的同时让内核在后台预读下一个片段，读盘与写管道重叠进行
+                        if i < last:
+                            _prefetch_file(paths[i + 1])
+                        shutil.copyfileobj(infile, proc.stdin, self._merge_buffer_size)
+                proc.stdin.close()
+            except BrokenPipeError:
+                # FFmpeg 提前退出，失败原因由下面的退出码和 stderr 反映
+                pass
+            except BaseException:
+                proc.kill()
+                proc.wait()
+                raise
+            finally:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+            returncode = proc.wait()
+            if returncode:
+                stderr_file.seek(0)
+                raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr_file.read())
+
     def merge_files(self, file_list: List[str], output_file: str, temp_dir: str, quiet_mode=True) -> bool:
         """使用FFmpeg合并TS文件为MP4
 
@@ -39,23 +343,33 @@ class MergeHandler:
         Returns:
             bool: 是否成功
         """
-        # 首先验证所有文件都已下载并完整
+        # 每个URL只解析一次文件名，目录前缀只拼接一次
+        filenames = [self._extract_filename(url) for url in file_list]
+        prefix = os.path.join(temp_dir, '')
+
+        # 首先验证所有文件都已下载并完整：每个片段都要打开并读取文件头，
+        # 读文件时会释放 GIL，片段较多时用线程池并行校验
+        filepaths = [prefix + filename for filename in filenames]
+        if len(filepaths) >= _PARALLEL_VALIDATE_THRESHOLD:
+            with ThreadPoolExecutor(max_workers=_VALIDATE_WORKERS) as executor:
+                valid = list(executor.map(check_ts_header, filepaths))
+        else:
+            valid = [check_ts_header(filepath) for filepath in filepaths]
+
         all_files_exist = True
-        for url in file_list:
-            filename = self._extract_filename(url)
-            filepath = os.path.join(temp_dir, filename)
+        for filepath, ok in zip(filepaths, valid):
+            # 校验通过说明文件存在，只有失败时才区分缺失与无效
+            if ok:
+                continue
             if not os.path.exists(filepath):
                 self._safe_print(f"❌ 缺失文件: {filepath}", quiet_mode)
                 if self.logger:
                     self.logger.error(f"缺失文件: {filepath}")
-                all_files_exist = False
             else:
-                # 验证文件是否有效TS格式
-                if not check_ts_header(filepath):
-                    self._safe_print(f"❌ 无效文件: {filepath}", quiet_mode)
-                    if self.logger:
-                        self.logger.error(f"无效文件: {filepath}")
-                    all_files_exist = False
+                self._safe_print(f"❌ 无效文件: {filepath}", quiet_mode)
+                if self.logger:
+                    self.logger.error(f"无效文件: {filepath}")
+            all_files_exist = False
 
         if not all_files_exist:
             self._safe_print(f"❌ 无法合并 - 存在缺失或无效的TS文件", quiet_mode)
@@ -70,30 +384,27 @@ class MergeHandler:
         # 保持M3U8中的原始顺序，不排序（确保视频片段按正确顺序合并）
         preserved_order_files = file_list
 
-        # 创建文件列表文件用于FFmpeg
-        task_name = os.path.basename(output_file).replace('.mp4', '')
-        list_file = os.path.join(temp_dir, f'{task_name}_file_list.txt')
-
-        with open(list_file, 'w', encoding='utf-8') as f:
-            for url in preserved_order_files:
-                filename = self._extract_filename(url)
-                filepath = os.path.join(temp_dir, filename)
-                if os.path.exists(filepath):
-                    # 使用绝对路径，避免路径问题
-                    abs_path = os.path.abspath(filepath)
-                    # FFmpeg要求路径使用单引号包裹并转义
-                    f.write(f"file '{abs_path}'\n")
-
         # 检查FFmpeg是否可用
-        try:
-            subprocess.run(['ffmpeg', '-version'],
-                           stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE,
-                           check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        if not _ffmpeg_available():
             # FFmpeg不可用，回退到二进制合并
             self._safe_print("⚠️ FFmpeg未安装，使用二进制合并（可能不兼容某些视频）", quiet_mode)
-            return self.merge_files_binary(preserved_order_files, output_file, temp_dir, quiet_mode)
+            return self.merge_files_binary(preserved_order_files, output_file, temp_dir, quiet_mode,
+                                           filenames=filenames)
+
+        # 使用绝对路径，避免路径问题
+        abs_prefix = os.path.join(os.path.abspath(temp_dir), '')
+        abs_paths = [abs_prefix + filename for filename in filenames]
+
+        # TS 片段可以直接按字节拼接，不再写列表文件交给 concat 分离器逐个打开探测：
+        # 片段不多时用 concat 协议把路径直接传给 FFmpeg；路径中含 '|' 或参数过长时
+        # 把片段依次写入 FFmpeg 的标准输入，作为一条连续的 MPEG-TS 流
+        concat_input = 'concat:' + '|'.join(abs_paths)
+        use_pipe = len(concat_input) > _CONCAT_PROTOCOL_MAX_LEN \
+            or concat_input.count('|') != len(abs_paths) - 1
+        if use_pipe:
+            input_args = ['-f', 'mpegts', '-i', 'pipe:0']
+        else:
+            input_args = ['-i', concat_input]
 
         # 显示合并进度
         if self.config.show_progress and not quiet_mode:
@@ -102,43 +413,29 @@ class MergeHandler:
         # 使用FFmpeg合并
         cmd = [
             'ffmpeg',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', list_file,
+            *input_args,
             '-c', 'copy',
             '-bsf:a', 'aac_adtstoasc',  # 处理AAC音频流
             '-y',  # 覆盖输出文件
+            # 只输出错误信息：不输出版本信息和逐帧进度，stderr 只在失败时用于记录原因
+            '-hide_banner', '-nostats', '-loglevel', 'error',
             output_file
         ]
         if self.logger:
             self.logger.info(f"运行FFmpeg命令: {' '.join(cmd)}")
         try:
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=True
-            )
-            # 清理临时文件
-            if os.path.exists(list_file):
-                os.remove(list_file)
-            # 清理TS文件
-            for url in file_list:
-                filename = self._extract_filename(url)
-                filepath = os.path.join(temp_dir, filename)
-                if os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                    except Exception as e:
-                        if self.logger:
-                            self.logger.warning(f"删除临时文件 {filename} 失败: {e}")
-            # 删除目录
-            if os.path.exists(temp_dir):
-                try:
-                    os.rmdir(temp_dir)
-                except Exception as e:
-                    if self.logger:
-                        self.logger.warning(f"删除临时目录 {temp_dir} 失败: {e}")
+            if use_pipe:
+                self._run_ffmpeg_with_pipe(cmd, abs_paths)
+            else:
+                subprocess.run(
+                    cmd,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    check=True
+                )
+            self._fsync_file(output_file)
+            # 清理TS文件和临时目录
+            self._remove_segments(temp_dir, filenames)
             if self.config.show_progress and not quiet_mode:
                 self._safe_print("✅ 文件合并完成", quiet_mode)
 
@@ -149,9 +446,11 @@ class MergeHandler:
                 self.logger.error(
                     f"FFmpeg合并失败: {e.stderr.decode() if e.stderr else str(e)}")
             self._safe_print("⚠️ FFmpeg合并失败，尝试二进制合并...", quiet_mode)
-            return self.merge_files_binary(preserved_order_files, output_file, temp_dir, quiet_mode)
+            return self.merge_files_binary(preserved_order_files, output_file, temp_dir, quiet_mode,
+                                           filenames=filenames)
 
-    def merge_files_binary(self, file_list: List[str], output_file: str, temp_dir: str, quiet_mode=True) -> bool:
+    def merge_files_binary(self, file_list: List[str], output_file: str, temp_dir: str, quiet_mode=True,
+                           filenames: Optional[List[str]] = None) -> bool:
         """二进制合并TS文件（FFmpeg不可用时的回退方案）
         保持M3U8中的原始顺序
 
@@ -160,10 +459,14 @@ class MergeHandler:
             output_file: 输出文件路径
             temp_dir: 临时目录路径
             quiet_mode: 静默模式
+            filenames: 与 file_list 一一对应的文件名（已预先计算时传入，避免重复解析URL）
 
         Returns:
             bool: 是否成功
         """
+        if filenames is None:
+            filenames = [self._extract_filename(url) for url in file_list]
+        prefix = os.path.join(temp_dir, '')
         try:
             # 显示合并进度
             if self.config.show_progress and not quiet_mode:
@@ -172,35 +475,48 @@ class MergeHandler:
                     desc="合并进度",
                     ncols=60,
                     leave=False,
+                    # 片段很多时按时间和数量合并刷新，不必每个片段都重绘进度条
+                    mininterval=0.5,
+                    miniters=max(1, len(file_list) // 100),
+                    smoothing=0,
                     bar_format='{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt}'
                 )
             else:
                 merge_bar = None
 
-            with open(output_file, 'wb') as outfile:
-                for url in file_list:  # 保持M3U8中的原始顺序
-
-                    filename = self._extract_filename(url)
-                    filepath = os.path.join(temp_dir, filename)
-
-                    if os.path.exists(filepath):
-                        try:
-                            with open(filepath, 'rb') as infile:
-                                while True:
-                                    chunk = infile.read(
-                                        self.config.buffer_size)
-                                    if not chunk:
-                                        break
-                                    outfile.write(chunk)
-
-                            if merge_bar:
-                                merge_bar.update(1)
-
-                        except Exception as e:
-                            if self.logger:
-                                self.logger.warning(
-                                    f"合并文件 {filename} 时出错: {e}")
-                            continue
+            # 无缓冲打开输出文件：写入都是整个片段或大块数据，直接交给内核，
+            # 不再先复制到 Python 的写缓冲区
+            with open(output_file, 'wb', buffering=0) as outfile:
+                _fadvise(outfile.fileno(), 'POSIX_FADV_SEQUENTIAL')
+                # 总大小已知，一次性为输出文件分配磁盘空间，避免边写边扩展
+                total_size = self._segments_size(temp_dir, filenames)
+                self._preallocate(outfile.fileno(), total_size)
+                # 按片段的平均大小确定分块复制的缓冲区大小
+                buffer_size = self._adaptive_buffer_size(total_size, len(filenames))
+                if self.logger:
+                    self.logger.debug(f"二进制合并缓冲区大小: {buffer_size}")
+                for filename in filenames:  # 保持M3U8中的原始顺序
+                    filepath = prefix + filename
+
+                    # 缺失的片段直接跳过（由 os.open 抛出的异常判断，不再单独 stat）
+                    try:
+                        self._append_file(outfile, filepath, buffer_size)
+
+                        if merge_bar:
+                            merge_bar.update(1)
+
+                    except FileNotFoundError:
+                        continue
+                    except Exception as e:
+                        if self.logger:
+                            self.logger.warning(
+                                f"合并文件 {filename} 时出错: {e}")
+                        continue
+
+                # 有片段缺失或复制失败时，实际写入的数据少于预分配的大小，截掉多余部分
+                outfile.truncate()
+                outfile.flush()
+                os.fsync(outfile.fileno())
 
             if merge_bar:
                 merge_bar.close()
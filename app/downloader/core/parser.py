@@ -4,7 +4,9 @@ M3U8解析器模块
 支持加密 M3U8 的 #EXT-X-KEY 标签解析
 """
 
+import functools
 import re
+import threading
 from urllib.parse import urljoin, urlparse
 from typing import List, Dict, Optional, Tuple
 import requests
@@ -13,18 +15,124 @@ import warnings
 from urllib3.exceptions import InsecureRequestWarning
 
 from .crypto import EncryptionInfo
+from .utils import create_session
+
+# 流式读取 M3U8 响应时每次读取的字节数
+M3U8_READ_CHUNK_SIZE = 64 * 1024
+# 未传入会话时进程内共用的解析会话，每个主机保留的连接数
+PARSER_POOL_MAXSIZE = 64
+
+# 预编译的正则（解析时每行/每个标签都会用到，避免重复查询 re 模块的编译缓存）
+_RE_RESOLUTION = re.compile(r'RESOLUTION=(\d+x\d+)')
+_RE_BANDWIDTH = re.compile(r'BANDWIDTH=(\d+)')
+_RE_KEY_LINE = re.compile(r'#EXT-X-KEY:(.+)')
+_RE_MEDIA_SEQUENCE = re.compile(r'#EXT-X-MEDIA-SEQUENCE:(\d+)')
+
+
+def _parse_attrs(attr_string: str) -> Dict[str, str]:
+    """
+    解析标签的属性列表（逗号分隔的 KEY=VALUE，值可以是带引号的字符串）
+
+    一次从左到右扫描，引号内的逗号不作为分隔符
+
+    Args:
+        attr_string: 标签冒号之后的属性字符串
+
+    Returns:
+        Dict[str, str]: 属性名到属性值的映射（带引号的值已去掉引号）
+    """
+    attrs = {}
+    length = len(attr_string)
+    pos = 0
+    while pos < length:
+        eq = attr_string.find('=', pos)
+        if eq < 0:
+            break
+        key = attr_string[pos:eq].strip()
+        pos = eq + 1
+        if attr_string.startswith('"', pos):
+            end = attr_string.find('"', pos + 1)
+            if end < 0:
+                end = length
+            value = attr_string[pos + 1:end]
+            pos = attr_string.find(',', end)
+        else:
+            comma = attr_string.find(',', pos)
+            value = attr_string[pos:comma if comma >= 0 else length].strip()
+            pos = comma
+        if key:
+            attrs[key] = value
+        if pos < 0:
+            break
+        pos += 1
+    return attrs
+
+
+@functools.lru_cache(maxsize=4096)
+def _urlparse_cached(url: str):
+    """urlparse 的缓存版本（同一 URL 常被多次校验、拆分）"""
+    return urlparse(url)
+
+
+def _join_url(base_url: str, path: str) -> str:
+    """
+    将播放列表中的相对路径拼接到基础URL
+
+    最常见的情况是基础URL以 / 结尾、路径是不含 . 段的普通相对路径，直接拼接即可；
+    绝对路径、带协议、含 ./ ../ 段或基础URL带查询串时交给 urljoin 处理
+
+    Args:
+        base_url: 基础URL（以 / 结尾）
+        path: 相对路径
+
+    Returns:
+        str: 完整URL
+    """
+    if (path.startswith(('/', '.', '?', '#')) or '/.' in path
+            or ':' in path.partition('/')[0]
+            or '?' in base_url or '#' in base_url):
+        return urljoin(base_url, path)
+    return base_url + path
 
 
 class M3U8Parser:
     """M3U8文件解析器"""
 
-    def __init__(self, verify_ssl: bool = False):
+    # 进程内共用的会话（按是否验证 SSL 区分），避免每个解析器各自建立连接
+    _default_sessions: Dict[bool, requests.Session] = {}
+    _default_sessions_lock = threading.Lock()
+
+    def __init__(self, verify_ssl: bool = False, session: Optional[requests.Session] = None):
+        """
+        初始化解析器
+
+        Args:
+            verify_ssl: 是否验证 SSL 证书
+            session: 共用的 HTTP 会话（如下载片段用的会话），M3U8 与片段通常来自
+                同一源站，共用连接池可省去每个任务重新建立连接；不提供时使用
+                进程内共用的解析会话
+        """
         self.verify_ssl = verify_ssl
         if not verify_ssl:
             warnings.filterwarnings('ignore', category=InsecureRequestWarning)
 
-        self.session = requests.Session()
-        self.session.verify = verify_ssl
+        # 会话不修改请求头，请求头随每次请求传入，多个线程/实例可以安全共用
+        if session is None:
+            session = self._get_default_session(verify_ssl)
+        self.session = session
+
+    @classmethod
+    def _get_default_session(cls, verify_ssl: bool) -> requests.Session:
+        """获取或创建进程内共用的解析会话"""
+        session = cls._default_sessions.get(verify_ssl)
+        if session is None:
+            with cls._default_sessions_lock:
+                session = cls._default_sessions.get(verify_ssl)
+                if session is None:
+                    session = create_session(
+                        verify_ssl, pool_maxsize=PARSER_POOL_MAXSIZE)
+                    cls._default_sessions[verify_ssl] = session
+        return session
 
     def parse_m3u8(self, url: str, headers: Optional[Dict[str, str]] = None, save_path: Optional[str] = None, save_dir: Optional[str] = None) -> Tuple[List[str], Dict]:
         """
@@ -39,70 +147,87 @@ class M3U8Parser:
         Returns:
             Tuple[List[str], Dict]: (TS文件URL列表, 解析信息)
         """
+        response = None
         try:
-            if headers:
-                self.session.headers.update(headers)
-
-            response = self.session.get(url, timeout=30)
+            response = self.session.get(
+                url, timeout=30, headers=headers, stream=True)
             response.raise_for_status()
 
             # 获取基础URL
             base_url = url.rsplit('/', 1)[0] + '/'
 
-            # 解析M3U8内容
-            content = response.text
-            
-            # 如果指定了保存路径，将M3U8内容写入文件
+            # 如果指定了保存路径，需要完整内容，读取全文后写入文件；
+            # 否则边下载边按行解析，不在内存中保留整个播放列表
             if save_path:
+                content = response.text
                 try:
                     with open(save_path, 'w', encoding='utf-8') as f:
                         f.write(content)
                     self.logger.info(f"M3U8文件已保存到: {save_path}")
                 except Exception as e:
                     self.logger.error(f"保存M3U8文件失败: {e}")
-            ts_files = []
+                lines = content.splitlines()
+            else:
+                # M3U8 规定使用 UTF-8；未声明编码时 iter_lines 会返回 bytes
+                if response.encoding is None:
+                    response.encoding = 'utf-8'
+                lines = response.iter_lines(
+                    chunk_size=M3U8_READ_CHUNK_SIZE, decode_unicode=True)
+
+            media_lines = []
             resolution_info = {}
             bandwidth_info = {}
+            key_attrs = None
+            media_sequence = None
+            content_length = 0
 
-            # 解析加密信息
-            encryption_info = self._parse_encryption_key(content, base_url)
-
-            # 提取分辨率和带宽信息
-            for line in content.split('\n'):
-                if line.startswith('#EXT-X-STREAM-INF'):
-                    # 解析流媒体信息
-                    resolution_match = re.search(r'RESOLUTION=(\d+x\d+)', line)
-                    bandwidth_match = re.search(r'BANDWIDTH=(\d+)', line)
-
-                    if resolution_match:
-                        resolution_info['resolution'] = resolution_match.group(
-                            1)
-                    if bandwidth_match:
-                        bandwidth_info['bandwidth'] = int(
-                            bandwidth_match.group(1))
-
-            # 提取媒体序列号（用于 IV 生成）
-            media_sequence = self._parse_media_sequence(content)
-
-            # 提取TS文件
-            for line in content.split('\n'):
+            # 单次遍历：标签行按前缀分派，其余行提取TS文件
+            for line in lines:
+                content_length += len(line) + 1
                 line = line.strip()
-                if line and not line.startswith('#'):
-                    if line.endswith('.ts') or '.ts?' in line:
-                        # 完整URL
-                        if line.startswith('http'):
-                            ts_files.append(line)
-                            # 先把这个ts文件存储到一个文件里面
-
-                        else:
-                            # 相对路径
-                            ts_files.append(urljoin(base_url, line))
-                    elif line.endswith('.m3u8') or '.m3u8?' in line:
-                        # 嵌套的M3U8，递归处理（这里简化处理，直接作为TS文件）
-                        if line.startswith('http'):
-                            ts_files.append(line)
-                        else:
-                            ts_files.append(urljoin(base_url, line))
+                if not line:
+                    continue
+                if line.startswith('#'):
+                    if not line.startswith('#EXT'):
+                        continue
+                    if line.startswith('#EXT-X-STREAM-INF'):
+                        # 解析流媒体信息
+                        resolution_match = _RE_RESOLUTION.search(line)
+                        bandwidth_match = _RE_BANDWIDTH.search(line)
+
+                        if resolution_match:
+                            resolution_info['resolution'] = resolution_match.group(
+                                1)
+                        if bandwidth_match:
+                            bandwidth_info['bandwidth'] = int(
+                                bandwidth_match.group(1))
+                    elif line.startswith('#EXT-X-KEY:'):
+                        # 与原先一致，只取第一个加密标签
+                        if key_attrs is None:
+                            key_attrs = line[len('#EXT-X-KEY:'):]
+                    elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                        # 媒体序列号（用于 IV 生成）
+                        if media_sequence is None:
+                            match = _RE_MEDIA_SEQUENCE.match(line)
+                            if match:
+                                media_sequence = int(match.group(1))
+                    continue
+
+                # 只在查询串之前的路径部分判断扩展名；
+                # 嵌套的M3U8这里简化处理，直接作为TS文件
+                path = line.partition('?')[0]
+                if path.endswith('.ts') or path.endswith('.m3u8'):
+                    media_lines.append(line)
+
+            # 完整URL原样保留，相对路径拼接到基础URL
+            ts_files = [line if line.startswith('http') else _join_url(base_url, line)
+                        for line in media_lines]
+
+            # 解析加密信息
+            encryption_info = self._parse_key_attrs(
+                key_attrs, base_url) if key_attrs else None
+            if media_sequence is None:
+                media_sequence = 0
 
             # 解析信息
             parse_info = {
@@ -110,7 +235,7 @@ class M3U8Parser:
                 'base_url': base_url,
                 'resolution': resolution_info.get('resolution', 'N/A'),
                 'bandwidth': bandwidth_info.get('bandwidth', 'N/A'),
-                'content_length': len(content),
+                'content_length': content_length,
                 'encryption': encryption_info.to_dict() if encryption_info else None,
                 'is_encrypted': encryption_info.is_encrypted() if encryption_info else False,
                 'media_sequence': media_sequence,
@@ -119,6 +244,10 @@ class M3U8Parser:
 
         except Exception as e:
             raise Exception(f"M3U8解析失败: {e}")
+        finally:
+            # 流式请求未读完时需要显式释放连接
+            if response is not None:
+                response.close()
 
     def _parse_encryption_key(self, content: str, base_url: str) -> Optional[EncryptionInfo]:
         """
@@ -135,26 +264,36 @@ class M3U8Parser:
             EncryptionInfo: 加密信息，如果未加密返回 None
         """
         # 查找 #EXT-X-KEY 标签
-        key_pattern = r'#EXT-X-KEY:(.+)'
-        match = re.search(key_pattern, content)
+        match = _RE_KEY_LINE.search(content)
 
         if not match:
             return None
 
-        key_attrs = match.group(1)
+        return self._parse_key_attrs(match.group(1), base_url)
+
+    def _parse_key_attrs(self, key_attrs: str, base_url: str) -> EncryptionInfo:
+        """
+        解析 #EXT-X-KEY 标签的属性列表
+
+        Args:
+            key_attrs: 标签冒号之后的属性字符串
+            base_url: 基础 URL（用于相对路径转换）
+
+        Returns:
+            EncryptionInfo: 加密信息
+        """
+        attrs = _parse_attrs(key_attrs)
 
         # 解析 METHOD
-        method_match = re.search(r'METHOD=([^,\s]+)', key_attrs)
-        method = method_match.group(1) if method_match else "NONE"
+        method = attrs.get('METHOD') or "NONE"
 
         if method == "NONE":
             return EncryptionInfo(method="NONE")
 
         # 解析 URI
-        uri_match = re.search(r'URI="([^"]+)"', key_attrs)
         uri = None
-        if uri_match:
-            uri_value = uri_match.group(1)
+        uri_value = attrs.get('URI')
+        if uri_value:
             # 处理相对路径
             if not uri_value.startswith('http'):
                 uri = urljoin(base_url, uri_value)
@@ -163,9 +302,8 @@ class M3U8Parser:
 
         # 解析 IV
         iv = None
-        iv_match = re.search(r'IV=([^,\s]+)', key_attrs)
-        if iv_match:
-            iv_string = iv_match.group(1)
+        iv_string = attrs.get('IV')
+        if iv_string:
             try:
                 # 移除 0x 前缀并转换为 bytes
                 if iv_string.startswith('0x') or iv_string.startswith('0X'):
@@ -174,16 +312,9 @@ class M3U8Parser:
             except ValueError:
                 iv = None
 
-        # 解析 KEYFORMAT
-        keyformat_match = re.search(r'KEYFORMAT="([^"]+)"', key_attrs)
-        key_format = keyformat_match.group(
-            1) if keyformat_match else "identity"
-
-        # 解析 KEYFORMATVERSIONS
-        keyformat_versions_match = re.search(
-            r'KEYFORMATVERSIONS="([^"]+)"', key_attrs)
-        key_format_versions = keyformat_versions_match.group(
-            1) if keyformat_versions_match else ""
+        # 解析 KEYFORMAT / KEYFORMATVERSIONS
+        key_format = attrs.get('KEYFORMAT') or "identity"
+        key_format_versions = attrs.get('KEYFORMATVERSIONS') or ""
 
         return EncryptionInfo(
             method=method,
@@ -205,7 +336,7 @@ class M3U8Parser:
         Returns:
             int: 媒体序列号起始值
         """
-        match = re.search(r'#EXT-X-MEDIA-SEQUENCE:(\d+)', content)
+        match = _RE_MEDIA_SEQUENCE.search(content)
         return int(match.group(1)) if match else 0
 
     def parse_m3u8_extended(self, url: str, headers: Optional[Dict[str, str]] = None) -> 'M3U8Info':
@@ -225,7 +356,7 @@ class M3U8Parser:
     def validate_url(self, url: str) -> bool:
         """验证URL格式"""
         try:
-            result = urlparse(url)
+            result = _urlparse_cached(url)
             return all([result.scheme, result.netloc])
         except:
             return False
@@ -233,7 +364,7 @@ class M3U8Parser:
     def get_url_info(self, url: str) -> Dict:
         """获取URL信息"""
         try:
-            parsed = urlparse(url)
+            parsed = _urlparse_cached(url)
             return {
                 'scheme': parsed.scheme,
                 'netloc': parsed.netloc,
@@ -250,7 +381,7 @@ class M3U8Parser:
 
     def is_m3u8_url(self, url: str) -> bool:
         """判断是否为M3U8 URL"""
-        return url.endswith('.m3u8') or '.m3u8?' in url.lower()
+        return url.partition('?')[0].lower().endswith('.m3u8')
 
 
 class M3U8Info:
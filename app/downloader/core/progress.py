@@ -6,6 +6,7 @@
 import sys
 import threading
 import time
+from collections import Counter
 from typing import Dict, Optional, List, Callable
 from dataclasses import dataclass, field
 from enum import Enum
@@ -66,6 +67,10 @@ class MultiTaskProgress:
         self._summary_position = max_display_tasks  # 汇总信息位置
         self._enabled = True
         self._summary_bar: Optional[tqdm] = None
+        # 重绘线程：片段完成时只更新计数，由该线程定期统一刷新进度条
+        self._painter: Optional[threading.Thread] = None
+        self._painter_stop = threading.Event()
+        self._paint_interval = 0.2
 
     def __bool__(self):
         """
@@ -83,6 +88,56 @@ class MultiTaskProgress:
         """禁用进度显示"""
         self._enabled = False
 
+    def start(self, interval: float = 0.2):
+        """
+        启动重绘线程
+
+        启动后 increment_task 只更新计数，不再在下载线程中操作进度条，
+        进度条由重绘线程每隔 interval 秒刷新一次
+
+        Args:
+            interval: 刷新间隔（秒）
+        """
+        if self._painter is not None:
+            return
+        self._paint_interval = interval
+        self._painter_stop.clear()
+        self._painter = threading.Thread(
+            target=self._paint_loop, name="progress-painter", daemon=True)
+        self._painter.start()
+
+    def stop(self):
+        """停止重绘线程，并做最后一次刷新"""
+        if self._painter is None:
+            return
+        self._painter_stop.set()
+        self._painter.join()
+        self._painter = None
+        self._paint()
+
+    def _paint_loop(self):
+        """重绘线程主循环"""
+        while not self._painter_stop.wait(self._paint_interval):
+            self._paint()
+
+    def _paint(self):
+        """根据计数刷新所有进度条"""
+        if not self._enabled:
+            return
+        with self._lock:
+            snapshot = [(name, task.pbar, task.status, task.completed_segments, task.failed_segments)
+                        for name, task in self._tasks.items() if task.pbar]
+        for name, pbar, status, completed, failed in snapshot:
+            n = completed + failed
+            if pbar.n == n:
+                continue
+            if failed:
+                pbar.set_description(
+                    self._format_desc(name, status, f"({failed} failed)"),
+                    refresh=False)
+            pbar.n = n
+            pbar.refresh()
+
     def _allocate_position(self, task_name: str) -> int:
         """分配一个进度条位置"""
         with self._lock:
@@ -220,13 +275,14 @@ class MultiTaskProgress:
             task.pbar.n = task.completed_segments + task.failed_segments
             task.pbar.refresh()
 
-    def increment_task(self, task_name: str, success: bool = True):
+    def increment_task(self, task_name: str, success: bool = True, count: int = 1):
         """
         增加任务进度
 
         Args:
             task_name: 任务名称
             success: 是否成功
+            count: 增加的片段数
         """
         with self._lock:
             if task_name not in self._tasks:
@@ -235,19 +291,23 @@ class MultiTaskProgress:
             task = self._tasks[task_name]
 
             if success:
-                task.completed_segments += 1
+                task.completed_segments += count
             else:
-                task.failed_segments += 1
+                task.failed_segments += count
+
+        # 重绘线程运行时由它统一刷新，这里只更新计数
+        if self._painter is not None:
+            return
 
         # 更新进度条
         if self._enabled and task.pbar:
-            extra = ""
-            if task.failed_segments > 0:
+            # 只有失败数变化时才更新描述；刷新交给 tqdm 按 mininterval 合并
+            if not success:
                 extra = f"({task.failed_segments} failed)"
-
-            task.pbar.set_description(
-                self._format_desc(task_name, task.status, extra))
-            task.pbar.update(1)
+                task.pbar.set_description(
+                    self._format_desc(task_name, task.status, extra),
+                    refresh=False)
+            task.pbar.update(count)
 
     def complete_task(self, task_name: str, success: bool = True, message: str = ""):
         """
@@ -270,6 +330,7 @@ class MultiTaskProgress:
         if self._enabled and task.pbar:
             status = TaskStatus.COMPLETED if success else TaskStatus.FAILED
             final_desc = self._format_desc(task_name, status, message)
+            task.pbar.n = task.completed_segments + task.failed_segments
             task.pbar.set_description(final_desc)
             task.pbar.close()
             task.pbar = None
@@ -284,22 +345,24 @@ class MultiTaskProgress:
 
     def get_summary(self) -> Dict:
         """获取所有任务的汇总信息"""
+        # 锁内只复制状态列表，统计在锁外单次完成，减少对进度更新线程的阻塞
         with self._lock:
-            total_tasks = len(self._tasks)
-            completed = sum(1 for t in self._tasks.values()
-                            if t.status == TaskStatus.COMPLETED)
-            failed = sum(1 for t in self._tasks.values()
-                         if t.status == TaskStatus.FAILED)
-            in_progress = sum(1 for t in self._tasks.values() if t.status in (
-                TaskStatus.DOWNLOADING, TaskStatus.MERGING, TaskStatus.DOWNLOAD_COMPLETED))
-
-            return {
-                'total': total_tasks,
-                'completed': completed,
-                'failed': failed,
-                'in_progress': in_progress,
-                'pending': total_tasks - completed - failed - in_progress
-            }
+            statuses = [t.status for t in self._tasks.values()]
+
+        counts = Counter(statuses)
+        total_tasks = len(statuses)
+        completed = counts[TaskStatus.COMPLETED]
+        failed = counts[TaskStatus.FAILED]
+        in_progress = (counts[TaskStatus.DOWNLOADING] + counts[TaskStatus.MERGING]
+                       + counts[TaskStatus.DOWNLOAD_COMPLETED])
+
+        return {
+            'total': total_tasks,
+            'completed': completed,
+            'failed': failed,
+            'in_progress': in_progress,
+            'pending': total_tasks - completed - failed - in_progress
+        }
 
     def print_summary(self):
         """打印汇总信息"""
@@ -318,6 +381,7 @@ class MultiTaskProgress:
 
     def clear(self):
         """清理所有任务"""
+        self.stop()
         with self._lock:
             for task in self._tasks.values():
                 if task.pbar:
@@ -371,7 +435,7 @@ class SegmentProgressTracker:
             status=TaskStatus.DOWNLOADING
         )
 
-    def on_segment_complete(self, success: bool = True, filename: str = "", error: str = ""):
+    def on_segment_complete(self, success: bool = True, filename: str = "", error: str = "", count: int = 1):
         """
         片段下载完成回调
 
@@ -379,12 +443,13 @@ class SegmentProgressTracker:
             success: 是否成功
             filename: 文件名
             error: 错误信息
+            count: 完成的片段数（批量更新时使用）
         """
         with self._lock:
             if success:
-                self._completed += 1
+                self._completed += count
             else:
-                self._failed += 1
+                self._failed += count
                 # 记录失败的详细信息
                 if filename:
                     self._failed_details.append({
@@ -392,7 +457,7 @@ class SegmentProgressTracker:
                         "error": error
                     })
 
-        self.progress_manager.increment_task(self.task_name, success)
+        self.progress_manager.increment_task(self.task_name, success, count)
         
         # 检查是否所有片段都下载完成
         if self._completed + self._failed >= self.total_segments:
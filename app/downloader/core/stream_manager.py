@@ -3,14 +3,13 @@
 主要的下载管理类，整合各组件功能
 """
 
-import os
 import threading
 import signal
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional
 from tqdm import tqdm
 
-from .config import DownloadConfig
+from .config import DownloadConfig, forget_dir
 from .download import DownloadTask
 from .json_loader import JSONTaskLoader
 from .progress import MultiTaskProgress, SegmentProgressTracker, TaskStatus
@@ -105,38 +104,14 @@ class StreamDownloadManager:
         """信号处理"""
         if self.logger:
             self.logger.info("收到中断信号，正在停止下载...")
+        self.download_handler.abort()
 
     def merge_files(self, file_list: List[str], output_file: str, temp_dir: str) -> bool:
-        """合并文件 - 为每个任务创建独立的FileMerger实例"""
-        # 首先验证所有文件都已下载并完整
-        all_files_exist = True
-        for url in file_list:
-            filename = os.path.basename(url.split('?')[0])
-            filepath = os.path.join(temp_dir, filename)
-            if not os.path.exists(filepath):
-                print(f"❌ 缺失文件: {filepath}")
-                if self.logger:
-                    self.logger.error(f"缺失文件: {filepath}")
-                all_files_exist = False
-            else:
-                # 验证文件是否有效TS格式
-                from .utils import check_ts_header
-                if not check_ts_header(filepath):
-                    print(f"❌ 无效文件: {filepath}")
-                    if self.logger:
-                        self.logger.error(f"无效文件: {filepath}")
-                    all_files_exist = False
-
-        if not all_files_exist:
-            print(f"❌ 无法合并 - 存在缺失或无效的TS文件")
-            if self.logger:
-                self.logger.error(f"无法合并 - 存在缺失或无效的TS文件")
-            return False
+        """合并文件 - 为每个任务创建独立的FileMerger实例
 
-        if self.logger:
-            self.logger.info(
-                f"合并文件: {output_file},temp_dir: {temp_dir}")
-        
+        片段是否缺失、是否为有效TS由 MergeHandler.merge_files 统一校验，这里不再重复检查；
+        使用默认的静默模式，避免批量下载时打印内容打乱多任务进度条，缺失/无效片段记录到日志
+        """
         return self.merge_handler.merge_files(file_list, output_file, temp_dir)
 
     def download_batch_tasks(self, tasks: List[DownloadTask], max_concurrent: int = 6) -> Dict[str, bool]:
@@ -152,6 +127,7 @@ class StreamDownloadManager:
         """
         results = {}
         self._total_tasks = len(tasks)
+        self.download_handler.reset_abort()
 
         print(f"\n🚀 开始批量处理 {len(tasks)} 个任务")
         print(f"📊 最大并发数: {max_concurrent}")
@@ -160,12 +136,17 @@ class StreamDownloadManager:
         # 创建多任务进度管理器
         self._progress_manager = MultiTaskProgress(
             max_display_tasks=max_concurrent)
+        # 进度条由单独的线程定期刷新，下载线程只更新计数
+        self._progress_manager.start()
         self._quiet_mode = True  # 启用静默模式，使用进度条显示
 
         # 禁用控制台日志输出，避免干扰进度条
         if self.logger:
             disable_console_logging(self.logger)
 
+        # 所有任务的片段共用一个下载线程池，线程和 HTTP 连接在任务之间复用
+        self.task_processor.open_segment_pool(max_concurrent)
+
         try:
             # 使用线程池执行任务，限制并发数
             with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
@@ -219,6 +200,11 @@ class StreamDownloadManager:
                             self.logger.error(f"合并任务异常: {e}")
                 self._merge_task = []
 
+            # 释放片段下载线程池、解密进程池和内存中的任务密钥
+            self.task_processor.close_segment_pool()
+            self.download_handler.shutdown()
+            self.download_handler.clear_task_keys()
+
             # 恢复非静默模式
             self._quiet_mode = False
 
@@ -254,11 +240,14 @@ class StreamDownloadManager:
         """清理密钥缓存目录"""
         try:
             cache_dir = self.config.key_cache_dir
-            if os.path.exists(cache_dir):
-                import shutil
-                shutil.rmtree(cache_dir)
-                if self.logger:
-                    self.logger.info(f"已清理密钥缓存目录: {cache_dir}")
+            import shutil
+            shutil.rmtree(cache_dir)
+            forget_dir(cache_dir)
+            if self.logger:
+                self.logger.info(f"已清理密钥缓存目录: {cache_dir}")
+        except FileNotFoundError:
+            # 目录不存在，无需清理
+            pass
         except Exception as e:
             if self.logger:
                 self.logger.warning(f"清理密钥缓存目录失败: {e}")
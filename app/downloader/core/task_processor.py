@@ -4,6 +4,7 @@
 """
 
 import os
+from contextlib import nullcontext
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional, Any
 from .config import DownloadConfig
@@ -25,8 +26,36 @@ class TaskProcessor:
         self._total_progress = 0
         self._total_tasks = 0  # 这将在处理任务时被更新
         self._media_sequence = 0
+        # 批量下载时所有任务共用的片段下载线程池
+        self._segment_pool: Optional[ThreadPoolExecutor] = None
 
-    def get_downloaded_files(self, save_dir: str, urls: List[str], validate: bool = False) -> set:
+    def open_segment_pool(self, max_concurrent: int):
+        """
+        创建批量下载共用的片段下载线程池
+
+        Args:
+            max_concurrent: 最大并发任务数
+        """
+        if self._segment_pool is None:
+            self._segment_pool = ThreadPoolExecutor(
+                max_workers=self.config.num_threads * max_concurrent)
+        # 共用线程池的所有线程使用同一个会话，连接池随之放大
+        self.download_handler.ensure_pool_size(max_concurrent)
+
+    def close_segment_pool(self):
+        """关闭共用的片段下载线程池"""
+        if self._segment_pool is not None:
+            self._segment_pool.shutdown(wait=True)
+            self._segment_pool = None
+
+    def _segment_executor(self):
+        """获取片段下载线程池：批量下载时使用共用线程池，否则为当前任务单独创建"""
+        if self._segment_pool is not None:
+            return nullcontext(self._segment_pool)
+        return ThreadPoolExecutor(max_workers=self.config.num_threads)
+
+    def get_downloaded_files(self, save_dir: str, urls: List[str], validate: bool = False,
+                             filenames: Optional[List[str]] = None) -> set:
         """
         获取已下载的文件集合
 
@@ -34,21 +63,31 @@ class TaskProcessor:
             save_dir: 保存目录
             urls: URL列表
             validate: 是否验证文件有效性（检查TS头部）
+            filenames: 与 urls 一一对应的文件名（已预先计算时传入，避免重复解析URL）
 
         Returns:
             已下载的文件URL集合
         """
+        if filenames is None:
+            filenames = [extract_filename(url) for url in urls]
         downloaded = set()
-        for url in urls:
-            filename = extract_filename(url)
-            filepath = os.path.join(save_dir, filename)
-            if os.path.exists(filepath):
-                # 如果启用验证，检查文件是否有效
-                if validate:
-                    if check_ts_header(filepath):
-                        downloaded.add(url)
-                else:
+        # 一次 scandir 列出目录，不存在的片段不再逐个 stat
+        try:
+            with os.scandir(save_dir) as it:
+                names = {entry.name for entry in it}
+        except OSError:
+            return downloaded
+        # 目录前缀只拼接一次，循环中直接字符串相加
+        prefix = os.path.join(save_dir, '')
+        for url, filename in zip(urls, filenames):
+            if filename not in names:
+                continue
+            # 如果启用验证，检查文件是否有效
+            if validate:
+                if check_ts_header(prefix + filename):
                     downloaded.add(url)
+            else:
+                downloaded.add(url)
         return downloaded
 
     def _build_encryption_info(self, parse_info: Dict, task: DownloadTask):
@@ -77,18 +116,18 @@ class TaskProcessor:
                 key_format_versions=encryption_data.get('key_format_versions', '')
             )
 
-            # 预加载密钥
-            if enc_info.is_encrypted() and enc_info.uri and self.download_handler._decryptor:
-                ok = self.download_handler._decryptor.load_key_from_uri(
+            # 预加载密钥：在后台下载，与第一批片段的下载同时进行，片段解密前才等待密钥；
+            # 配置了自定义密钥时使用本地密钥，不再从 URI 下载
+            if (enc_info.is_encrypted() and enc_info.uri and self.download_handler._decryptor
+                    and not self.config.get_custom_key()):
+                future = self.download_handler._decryptor.key_manager.preload_async(
                     enc_info.uri,
                     task.name,  # 用任务名做缓存空间隔离
                     verify_ssl=self.config.verify_ssl,
                     headers=self.config.headers
                 )
-                if ok:
-                    print(f"🔐 任务【{task.name}】已加载解密密钥")
-                else:
-                    print(f"⚠️ 任务【{task.name}】无法加载解密密钥: {enc_info.uri}")
+                future.add_done_callback(
+                    lambda f, name=task.name, uri=enc_info.uri: self._on_key_loaded(name, uri, f))
 
             return enc_info
         except ImportError as e:
@@ -98,6 +137,26 @@ class TaskProcessor:
             print(f"❌ 构建加密信息失败: {e}")
             return None
 
+    def _on_key_loaded(self, task_name: str, uri: str, future):
+        """
+        密钥预取完成后的回调
+
+        在密钥加载线程中执行，回调抛出的异常会被 Future 吞掉，因此在这里捕获并提示
+        """
+        try:
+            ok = future.result()
+            if ok:
+                # 密钥在整个任务内固定，记住密钥并提前准备好解密上下文
+                self.download_handler.set_task_key(task_name, ok)
+                self.download_handler._decryptor.prepare_schedule(ok)
+                print(f"🔐 任务【{task_name}】已加载解密密钥")
+            else:
+                print(f"⚠️ 任务【{task_name}】无法加载解密密钥: {uri}")
+        except Exception as e:
+            print(f"⚠️ 任务【{task_name}】解密密钥无效: {e}")
+            if self.logger:
+                self.logger.warning(f"任务 {task_name} 解密密钥无效: {e}")
+
     def _download_task_with_progress(self, task: DownloadTask, progress_manager: MultiTaskProgress, total_tasks: int = 0) -> bool:
         """
         带进度条的任务下载（用于批量下载模式）
@@ -188,7 +247,8 @@ class TaskProcessor:
                 self.logger.info(f"任务 {task.name}: 开始解析M3U8")
             # 保留基本的解析开始信息
             print(f"🔍 任务 {task.name}: 开始解析M3U8")
-            parser = M3U8Parser(verify_ssl=self.config.verify_ssl)
+            parser = M3U8Parser(verify_ssl=self.config.verify_ssl,
+                                session=self.download_handler.session)
             ts_files, parse_info = parser.parse_m3u8(
                 task.url, self.config.headers)
 
@@ -222,13 +282,18 @@ class TaskProcessor:
             # 创建临时目录
             os.makedirs(task_temp_dir, exist_ok=True)
 
-            # 检查已下载的文件
-            downloaded = self.get_downloaded_files(task_temp_dir, ts_files)
+            # 建立 URL -> 原始索引 的映射，首次下载和重试共用，确保segment_index正确
+            url_to_index_map = {url: i for i, url in enumerate(ts_files)}
+            # 每个片段的文件名只解析一次，之后按索引取用
+            filenames = [extract_filename(url) for url in ts_files]
+
+            # 检查已下载的文件（同时验证TS头部，无效文件会重新下载，之后无需再扫描目录）
+            downloaded = self.get_downloaded_files(
+                task_temp_dir, ts_files, validate=True, filenames=filenames)
 
             # 更新已完成的进度
             if downloaded and tracker:
-                for _ in range(len(downloaded)):
-                    tracker.on_segment_complete(success=True)
+                tracker.on_segment_complete(success=True, count=len(downloaded))
                 if self.logger:
                     self.logger.info(f"任务 {task.name}: 检测到 {len(downloaded)} 个已下载文件")
 
@@ -265,18 +330,14 @@ class TaskProcessor:
                     print(f"🏁 任务 {task.name}: 合并{'成功' if merge_success else '失败'}")
                 return merge_success
 
-            # 建立 URL -> 原始索引 的映射，确保segment_index正确
-            url_to_index_map = {url: i for i, url in enumerate(ts_files)}
-
             # 使用线程池并发下载
             if self.logger:
                 self.logger.info(f"任务 {task.name}: 开始下载 {len(remaining_urls)} 个文件")
             # 不在控制台显示开始下载的信息
-            with ThreadPoolExecutor(max_workers=self.config.num_threads) as executor:
+            with self._segment_executor() as executor:
                 # 创建下载任务
                 futures = {}
                 for url in remaining_urls:
-                    filename = extract_filename(url)
                     # 从映射表中获取真实的索引，确保解密时使用正确的segment_index
                     segment_index = url_to_index_map.get(url, -1)
                     if segment_index == -1:
@@ -286,16 +347,19 @@ class TaskProcessor:
 
                     future = executor.submit(
                         self.download_handler.download_file_stream,
-                        url, task_temp_dir, filename, task.name, segment_index, enc_info
+                        url, task_temp_dir, filenames[segment_index], task.name, segment_index, enc_info,
+                        known_missing=True
                     )
-                    futures[future] = url
+                    futures[future] = segment_index
 
                 # 等待所有任务完成
                 completed_count = 0
+                processed_count = 0
                 failed_downloads = []  # 存储失败的下载信息
                 for future in as_completed(futures):
-                    url = futures[future]
-                    filename = extract_filename(url)
+                    segment_index = futures[future]
+                    url = ts_files[segment_index]
+                    filename = filenames[segment_index]
                     try:
                         if self.logger:
                             self.logger.info(f"任务 {task.name} 下载完成: {url}")
@@ -332,23 +396,20 @@ class TaskProcessor:
                             self.logger.error(f"下载片段 {url} 失败: {e}")
 
                     # 更新进度显示 - 只在日志中记录，不在控制台输出
-                    completed = len([f for f in futures if f.done()])
-                    total_remaining = len(remaining_urls)
-                    if completed % 10 == 0 or completed == total_remaining:
-                        downloaded_now = self.get_downloaded_files(task_temp_dir, ts_files)
-                        downloaded_count = len(downloaded_now)
+                    processed_count += 1
+                    if self.logger and (processed_count % 10 == 0 or processed_count == len(futures)):
+                        downloaded_count = len(downloaded) + completed_count
                         missing_count = len(ts_files) - downloaded_count
-                        if self.logger:
-                            self.logger.info(f"任务 {task.name} 进度: {downloaded_count}/{len(ts_files)} 已下载, {missing_count} 剩余")
+                        self.logger.info(f"任务 {task.name} 进度: {downloaded_count}/{len(ts_files)} 已下载, {missing_count} 剩余")
 
                 if self.logger:
                     self.logger.info(f"任务 {task.name}: 所有下载任务完成，成功 {completed_count}/{len(remaining_urls)}")
                 # 不在控制台显示完成统计
 
                 # 所有下载任务完成后，检查并合并文件
-                all_downloaded = self.get_downloaded_files(
-                    task_temp_dir, ts_files, validate=True)
-                missing_count = len(ts_files) - len(all_downloaded)
+                # 成功的片段在下载时已验证过TS头部，缺失的就是下载失败的片段
+                missing_urls = [item["url"] for item in failed_downloads]
+                missing_count = len(missing_urls)
                 os.makedirs(task.output_dir, exist_ok=True)
                 output_file = os.path.join(task.output_dir, f"{task.name}.mp4")
 
@@ -361,8 +422,7 @@ class TaskProcessor:
                         self.logger.warning(f"任务 {task.name}: {missing_count} 个文件缺失，开始重试下载")
 
                     # 重试下载未完成的文件（最多重试3次）
-                    remaining_urls = [
-                        url for url in ts_files if url not in all_downloaded]
+                    remaining_urls = missing_urls
                     max_retry_attempts = 3
 
                     for retry_attempt in range(max_retry_attempts):
@@ -372,17 +432,13 @@ class TaskProcessor:
                         retry_urls = []
 
                         for url in remaining_urls:
-                            filename = extract_filename(url)
-                            filepath = os.path.join(task_temp_dir, filename)
-                            
-                            # 检查文件是否存在且有效
-                            if os.path.exists(filepath) and check_ts_header(filepath):
-                                continue  # 文件有效，跳过
-                        
-                            # 重新下载文件
+                            segment_index = url_to_index_map[url]
+                            filename = filenames[segment_index]
+
+                            # 重新下载文件（已存在的有效文件会在 download_file_stream 中跳过）
                             try:
                                 result = self.download_handler.download_file_stream(
-                                    url, task_temp_dir, filename, task.name, url_to_index_map[url], enc_info)
+                                    url, task_temp_dir, filename, task.name, segment_index, enc_info)
                                 success = result.get("success", False)
                                 if success:
                                     if self.logger:
@@ -414,9 +470,7 @@ class TaskProcessor:
                             remaining_urls = retry_urls  # 更新重试列表
 
                     # 检查重试后是否仍有缺失的文件
-                    all_downloaded = self.get_downloaded_files(
-                        task_temp_dir, ts_files, validate=True)
-                    missing_count = len(ts_files) - len(all_downloaded)
+                    missing_count = len(retry_urls)
                     if missing_count > 0:
                         if self.logger:
                             self.logger.error(f"任务 {task.name}: 重试后仍有 {missing_count} 个文件未成功下载，合并失败")
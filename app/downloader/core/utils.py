@@ -11,10 +11,12 @@ import logging
 from logging.handlers import RotatingFileHandler  # 导入RotatingFileHandler
 import signal
 import warnings
+import functools
 from typing import Dict, List, Optional, Callable
 from urllib.parse import urlparse
 import hashlib
 import requests
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
 
 
@@ -87,13 +89,16 @@ def enable_console_logging(logger: logging.Logger):
             logger.addHandler(console_handler)
 
 
-def create_session(verify_ssl: bool = False, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+def create_session(verify_ssl: bool = False, headers: Optional[Dict[str, str]] = None,
+                   pool_maxsize: Optional[int] = None) -> requests.Session:
     """
     创建配置好的 HTTP 会话
 
     Args:
         verify_ssl: 是否验证 SSL 证书
         headers: 自定义请求头
+        pool_maxsize: 每个主机保留的连接数，不小于并发下载线程数时
+            所有线程都能复用长连接（默认使用 requests 的 10 个）
 
     Returns:
         requests.Session: 配置好的会话对象
@@ -107,12 +112,36 @@ def create_session(verify_ssl: bool = False, headers: Optional[Dict[str, str]] =
     if headers:
         session.headers.update(headers)
 
+    if pool_maxsize:
+        mount_connection_pool(session, pool_maxsize)
+
     return session
 
 
+def mount_connection_pool(session: requests.Session, pool_maxsize: int):
+    """
+    为会话挂载指定大小的连接池（替换原有的 http/https 适配器）
+
+    Args:
+        session: HTTP 会话
+        pool_maxsize: 每个主机保留的连接数
+    """
+    old_adapters = {session.adapters.get('http://'), session.adapters.get('https://')}
+    # 重试由 RetryHandler 负责，连接池本身不做重试
+    adapter = HTTPAdapter(pool_connections=pool_maxsize,
+                          pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # 关闭被替换的适配器，释放其中的空闲连接
+    for old in old_adapters:
+        if old is not None:
+            old.close()
+
+
+@functools.lru_cache(maxsize=4096)
 def extract_filename_from_url(url: str) -> str:
     """
-    从 URL 提取文件名,移除查询参数和片段标识
+    从 URL 提取文件名,移除查询参数和片段标识（结果按 URL 缓存，同一片段多次调用不再重复解析）
 
     Args:
         url: URL 字符串
@@ -120,8 +149,9 @@ def extract_filename_from_url(url: str) -> str:
     Returns:
         str: 文件名
     """
-    clean_url = url.split('?')[0].split('#')[0]
-    return clean_url.split('/')[-1]
+    # partition 只切分一次，不像 split 那样为每一段都创建字符串
+    clean_url = url.partition('?')[0].partition('#')[0]
+    return clean_url.rpartition('/')[2]
 
 
 def format_progress(completed: int, total: int, failed: int = 0) -> str:
@@ -327,6 +357,12 @@ class URLProcessor:
         ))
 
 
+@functools.lru_cache(maxsize=1024)
+def _cache_file_stem(key: str) -> str:
+    """缓存键 -> 文件名（同一个键只计算一次哈希）"""
+    return hashlib.md5(key.encode()).hexdigest()
+
+
 class CacheManager:
     """缓存管理器"""
 
@@ -336,8 +372,8 @@ class CacheManager:
 
     def get_cache_path(self, key: str) -> str:
         """获取缓存文件路径"""
-        # 使用hash生成文件名
-        hash_key = hashlib.md5(key.encode()).hexdigest()
+        # 使用hash生成文件名；保持 md5 以兼容已有的缓存文件
+        hash_key = _cache_file_stem(key)
         return os.path.join(self.cache_dir, f"{hash_key}.json")
 
     def save_cache(self, key: str, data: any) -> bool:
@@ -357,9 +393,7 @@ class CacheManager:
         """加载缓存"""
         try:
             cache_path = self.get_cache_path(key)
-            if not os.path.exists(cache_path):
-                return None
-
+            # 文件不存在时由下面的 except 返回 None，不再单独 stat
             with open(cache_path, 'r', encoding='utf-8') as f:
                 cached = json.load(f)
 
@@ -469,33 +503,46 @@ def safe_input(prompt: str, default: str = "") -> str:
     except (KeyboardInterrupt, EOFError):
         return default
 
+# 校验TS头部时读取的字节数（前10个TS包，每包188字节）
+TS_HEADER_SAMPLE_SIZE = 1880
+
+
+def is_ts_data(sample_data) -> bool:
+    """
+    检查一段数据是否以有效的TS包开头
+
+    Args:
+        sample_data: 文件开头的数据（至少包含前几个TS包）
+
+    Returns:
+        bool: 数据是否为有效的TS格式
+    """
+    sample_data = bytes(sample_data[:TS_HEADER_SAMPLE_SIZE])
+    if len(sample_data) < 4:
+        return False
+
+    # 标准TS包以0x47开头
+    if sample_data[0] != 0x47:
+        return False
+
+    # 进一步验证：检查前几个TS包的同步字节，至少前3个包应该是有效的
+    if len(sample_data) >= 188:
+        return sample_data[::188].count(0x47) >= 3
+    return True
+
+
 def check_ts_header(file_path):
     """检查TS文件头部是否正常"""
     try:
-        if not os.path.exists(file_path):
-            return False
-            
-        with open(file_path, 'rb') as f:
-            # 读取前188字节（一个TS包的大小）
-            header = f.read(188)
-            if len(header) < 4:
-                return False
-                
-            # 标准TS包以0x47开头
-            if header[0] == 0x47:
-                # 进一步验证：检查是否连续多个TS包都以0x47开头
-                # 读取更多数据验证
-                f.seek(0)
-                sample_data = f.read(min(1880, os.path.getsize(file_path)))  # 读取前10个TS包
-                if len(sample_data) >= 188:
-                    # 检查前几个TS包的同步字节
-                    valid_count = sum(1 for i in range(0, min(len(sample_data), 1880), 188) 
-                                     if i < len(sample_data) and sample_data[i] == 0x47)
-                    # 至少前3个包应该是有效的
-                    return valid_count >= 3
-                return True
-            else:
-                return False
+        # 直接用文件描述符一次读取前10个TS包，不创建文件对象，
+        # 文件不存在时 os.open 抛出异常，无需额外的 exists 检查；
+        # Windows 下必须带 O_BINARY，否则会按文本模式转换换行和 0x1A
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            sample_data = os.read(fd, TS_HEADER_SAMPLE_SIZE)
+        finally:
+            os.close(fd)
+        return is_ts_data(sample_data)
     except Exception as e:
         return False
 